@@ -0,0 +1,92 @@
+import hashlib
+import os
+import re
+import unicodedata
+
+from backend.cache import LRUCache
+from backend.shared_store import get_store
+
+# Answers to standalone chat questions, keyed on the normalized question plus the
+# learner's skill context. Cached answers keep the chunk boundaries they were streamed
+# with, so a replay produces exactly the same SSE events as the original stream.
+# When the shared store is shared between processes it is the second tier, so an answer
+# generated by one worker is replayed by all of them.
+
+ANSWER_CACHE_SIZE = int(os.environ.get("ANSWER_CACHE_SIZE", 2048))
+ANSWER_CACHE_TTL = int(os.environ.get("ANSWER_CACHE_TTL", 24 * 3600))
+
+_answers = LRUCache(maxsize=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL)
+_stats = {"stores": 0, "skipped": 0, "shared_hits": 0}
+
+_CONTRACTIONS = {
+    "what's": "what is",
+    "whats": "what is",
+    "how's": "how is",
+    "where's": "where is",
+    "who's": "who is",
+    "it's": "it is",
+    "that's": "that is",
+    "isn't": "is not",
+    "doesn't": "does not",
+    "don't": "do not",
+    "can't": "cannot",
+    "i'm": "i am",
+}
+# Politeness and filler that does not change what is being asked
+_LEADING_FILLER = re.compile(
+    r"^(?:(?:hi|hey|hello|please|pls|so|ok|okay)\b\s*"
+    r"|(?:can|could|would) you (?:please )?(?:tell me|explain|help me understand)\b\s*"
+    r"|(?:tell me|explain(?: to me)?)\b\s*)+"
+)
+_TRAILING_FILLER = re.compile(r"\s*\b(?:please|pls|thanks|thank you)$")
+
+
+def normalize(message):
+    """Folds case, unicode forms, punctuation, contractions and filler so trivially different questions share a key."""
+    text = unicodedata.normalize("NFKC", message).casefold()
+    text = text.replace("’", "'")
+    text = " ".join(_CONTRACTIONS.get(word, word) for word in text.split())
+    text = re.sub(r"[^\w\s+#]", " ", text)  # keep c++ and c#
+    text = " ".join(text.split())
+    text = _LEADING_FILLER.sub("", text)
+    text = _TRAILING_FILLER.sub("", text)
+    return " ".join(text.split())
+
+
+def answer_key(message, context):
+    raw = f"{context}\n{normalize(message)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def lookup(message, context):
+    """The cached chunks for this question in this skill context, or None."""
+    key = answer_key(message, context)
+    chunks = _answers.get(key)
+    if chunks is None:
+        store = get_store()
+        if store.shared:
+            chunks = store.get(f"answer:{key}")
+            if chunks is not None:
+                _stats["shared_hits"] += 1
+                _answers.set(key, chunks)
+    return chunks
+
+
+def store(message, context, chunks):
+    if not chunks or not "".join(chunks).strip():
+        _stats["skipped"] += 1
+        return
+    key = answer_key(message, context)
+    _answers.set(key, list(chunks))
+    store = get_store()
+    if store.shared:
+        store.set(f"answer:{key}", list(chunks), ttl=ANSWER_CACHE_TTL)
+    _stats["stores"] += 1
+
+
+def clear():
+    _answers.clear()
+
+
+def stats():
+    return {**_answers.stats(), **_stats}
@@ -1,7 +1,9 @@
 import os
+from dotenv import load_dotenv
 from flask import Flask, jsonify
 from flask_cors import CORS
 
+from backend import database, instrumentation, jobs, json_provider, metrics, migrations, quiz_bank
 from backend.auth import auth_bp
 from backend.models import db
 from flask_login import LoginManager, login_required, current_user
@@ -10,54 +12,92 @@ from backend.profile import profile_bp
 from backend.quiz import quiz_bp
 from backend.service import service_bp
 
-app = Flask(__name__)
-app.secret_key = os.environ.get('FLASK_SECRET_KEY', 'dev_secret_key')
+CORS_ORIGINS = ["http://localhost:3000"]
 
-CORS(app, supports_credentials=True, origins=["http://localhost:3000"])
 
+def create_app():
+    """
+    Builds the Flask app. WSGI servers call this once per worker process:
 
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///mydatabase.db'
+        gunicorn -c backend/gunicorn.conf.py "backend.app:create_app()"
 
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    Building it does not touch the schema or the model: create or migrate the database
+    with `flask --app backend.app db-upgrade`, and the Gemini client is created on first use.
+    """
+    # .env may set DATABASE_URL, FLASK_SECRET_KEY or GEMINI_API_KEY
+    load_dotenv()
 
-login_manager=LoginManager()
-login_manager.init_app(app)
-@login_manager.user_loader
-def load_user(user_id):
-    return db.session.get(User, int(user_id))
-@app.route("/whoami")
-@login_required
-def whoami():
-    return {"id": current_user.id, "email": current_user.email, "authenticated": current_user.is_authenticated}
+    app = Flask(__name__)
+    # orjson when installed, the stdlib otherwise; see backend/json_provider.py
+    app.json = json_provider.FastJSONProvider(app)
+    app.secret_key = os.environ.get('FLASK_SECRET_KEY', 'dev_secret_key')
 
+    CORS(app, supports_credentials=True, origins=CORS_ORIGINS, expose_headers=["X-Chat-Session"])
 
-db.init_app(app)
+    # DATABASE_URL and pool settings come from the environment; defaults to the local SQLite file
+    database.configure(app)
 
-with app.app_context():
-    #db.drop_all()
-    db.create_all()
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-#with app.app_context():
-#    python_skill = Skill.query.filter_by(name="python").first()
-#    if python_skill:
-#        Quiz.query.filter_by(skill_id=python_skill.id).delete()
-#        db.session.commit()
+    login_manager=LoginManager()
+    login_manager.init_app(app)
+    @login_manager.user_loader
+    def load_user(user_id):
+        return db.session.get(User, int(user_id))
+    @app.route("/whoami")
+    @login_required
+    def whoami():
+        return {"id": current_user.id, "email": current_user.email, "authenticated": current_user.is_authenticated}
 
 
-@app.errorhandler(404)
-def not_found(e):
-    return {"error": "Not Found"}, 404
+    db.init_app(app)
 
-@app.route("/health")
-def health():
-    return {"status": "ok"}
+    instrumentation.init_app(app)
+    metrics.init_app(app)
+    jobs.init_app(app)
+    app.cli.add_command(migrations.db_upgrade_command)
+    app.cli.add_command(migrations.check_indexes_command)
+    app.cli.add_command(quiz_bank.warm_quiz_bank_command)
+    quiz_bank.start_scheduler(app)
 
+    @app.errorhandler(404)
+    def not_found(e):
+        return {"error": "Not Found"}, 404
 
+    @app.route("/health")
+    def health():
+        return {"status": "ok"}
+
+    @app.route("/health/db")
+    def health_db():
+        return {"status": "ok", "pool": database.pool_stats(db.engine)}
+
+
+
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(quiz_bp)
+    app.register_blueprint(profile_bp)
+    app.register_blueprint(service_bp)
+    app.register_blueprint(jobs.jobs_bp)
+    return app
+
+
+_app = None
+
+
+def __getattr__(name):
+    # `from backend.app import app` still works: the default app is built on first access,
+    # so importing this module to reach create_app() does not build one as a side effect
+    global _app
+    if name == "app":
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-app.register_blueprint(auth_bp)
-app.register_blueprint(quiz_bp)
-app.register_blueprint(profile_bp)
-app.register_blueprint(service_bp)
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    dev_app = create_app()
+    with dev_app.app_context():
+        migrations.create_schema()
+    dev_app.run(debug=True)
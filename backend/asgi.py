@@ -0,0 +1,259 @@
+"""
+ASGI entry point: streaming endpoints run on the event loop, everything else on Flask.
+
+    uvicorn backend.asgi:app --workers 2
+    gunicorn -k uvicorn.workers.UvicornWorker -w 2 backend.asgi:app
+
+Under plain WSGI every open chat stream pins a worker thread for its whole length. Here
+the chat stream is an async handler using the async Gemini client, so thousands of idle
+streams cost a coroutine each. All other routes (every existing Blueprint) are served by
+the unchanged Flask app through a bounded thread pool, so /health and friends stay fast.
+"""
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from flask_login import current_user
+
+from backend import json_provider
+from backend.app import CORS_ORIGINS, app as flask_app
+from backend.chat import ChatSessionNotFound
+from backend.service import chat_events, open_chat
+
+# Threads available to the Flask app; async routes do not use them
+ASGI_WSGI_THREADS = int(os.environ.get("ASGI_WSGI_THREADS", 32))
+
+
+def _header(scope, name):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _cors_headers(scope):
+    # Mirrors the Flask-CORS settings in backend.app for routes that bypass Flask
+    origin = _header(scope, b"origin")
+    if origin in CORS_ORIGINS:
+        return [
+            (b"access-control-allow-origin", origin.encode("latin-1")),
+            (b"access-control-allow-credentials", b"true"),
+            (b"access-control-expose-headers", b"X-Chat-Session"),
+            (b"vary", b"Origin"),
+        ]
+    return []
+
+
+def _current_user_id(scope):
+    # Resolves the Flask-Login session cookie the same way a Flask route would
+    with flask_app.request_context(WSGIBridge.environ(scope, b"")):
+        return current_user.id if current_user.is_authenticated else None
+
+
+async def _send_json(send, scope, status, payload):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), *_cors_headers(scope)],
+    })
+    await send({"type": "http.response.body", "body": json_provider.dumpb(payload)})
+
+
+async def _watch_disconnect(receive, task):
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            task.cancel()
+            return
+
+
+async def chat_stream(scope, receive, send):
+    """Async /service/chat-gemini-stream; same contract as service.chat_gemini_stream."""
+    query = parse_qs(scope["query_string"].decode("latin-1"))
+    user_message = query.get("message", [""])[0].strip()
+    if not user_message:
+        await _send_json(send, scope, 400, {"error": "Message cannot be empty"})
+        return
+
+    user_id = await asyncio.to_thread(_current_user_id, scope)
+    try:
+        session_id, contents, system, cache_context = await open_chat(
+            flask_app, user_id, query.get("session", [None])[0] or None, user_message)
+    except ChatSessionNotFound:
+        await _send_json(send, scope, 404, {"error": "Chat session not found"})
+        return
+
+    headers = [
+        (b"content-type", b"text/event-stream; charset=utf-8"),
+        (b"cache-control", b"no-cache"),
+        *_cors_headers(scope),
+    ]
+    if session_id:
+        headers.append((b"x-chat-session", session_id.encode("latin-1")))
+    await send({"type": "http.response.start", "status": 200, "headers": headers})
+
+    async def stream():
+        async for event in chat_events(flask_app, user_message, session_id, contents, system, cache_context):
+            await send({"type": "http.response.body", "body": event.encode("utf-8"), "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+    # A client that goes away cancels the stream, which releases its model slot
+    task = asyncio.ensure_future(stream())
+    watcher = asyncio.ensure_future(_watch_disconnect(receive, task))
+    try:
+        await task
+    except asyncio.CancelledError:
+        if not task.cancelled():
+            raise
+    finally:
+        watcher.cancel()
+
+
+ASYNC_ROUTES = {
+    ("GET", "/service/chat-gemini-stream"): chat_stream,
+}
+
+
+class WSGIBridge:
+    """
+    Runs a WSGI app in a thread pool behind ASGI. Response chunks are forwarded as the
+    app produces them, so Flask's own streaming responses still stream.
+    """
+
+    def __init__(self, wsgi_app, max_workers):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="wsgi")
+
+    async def __call__(self, scope, receive, send):
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body.extend(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        disconnected = False
+
+        def put(item):
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+
+        def run():
+            response = {}
+
+            def start_response(status, headers, exc_info=None):
+                if exc_info and response.get("sent"):
+                    raise exc_info[1].with_traceback(exc_info[2])
+                response["status"] = int(status.split(" ", 1)[0])
+                response["headers"] = [
+                    (name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers
+                ]
+                return lambda data: put(("body", data))
+
+            try:
+                result = self.wsgi_app(self.environ(scope, bytes(body)), start_response)
+                try:
+                    for chunk in result:
+                        if not response.get("sent"):
+                            response["sent"] = True
+                            put(("start", response))
+                        if chunk:
+                            put(("body", chunk))
+                        if disconnected:
+                            break
+                finally:
+                    if hasattr(result, "close"):
+                        result.close()
+                if not response.get("sent"):
+                    put(("start", response))
+                put(("end", None))
+            except BaseException as e:
+                put(("error", e))
+
+        future = loop.run_in_executor(self.executor, run)
+        started = False
+        try:
+            while True:
+                kind, value = await queue.get()
+                if kind == "start":
+                    started = True
+                    await send({"type": "http.response.start", "status": value["status"], "headers": value["headers"]})
+                elif kind == "body":
+                    await send({"type": "http.response.body", "body": value, "more_body": True})
+                elif kind == "end":
+                    await send({"type": "http.response.body", "body": b""})
+                    break
+                else:
+                    if not started:
+                        await send({"type": "http.response.start", "status": 500, "headers": []})
+                        await send({"type": "http.response.body", "body": b""})
+                    raise value
+        except (OSError, asyncio.CancelledError):
+            # The client went away; let the worker thread stop at its next chunk
+            disconnected = True
+            raise
+        finally:
+            await asyncio.shield(future)
+
+    @staticmethod
+    def environ(scope, body):
+        server = scope.get("server") or ("localhost", 80)
+        client = scope.get("client") or ("", 0)
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+            "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+            "QUERY_STRING": scope["query_string"].decode("latin-1"),
+            "SERVER_NAME": server[0],
+            "SERVER_PORT": str(server[1]),
+            "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+            "REMOTE_ADDR": client[0],
+            "REMOTE_PORT": str(client[1]),
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": True,
+            "wsgi.run_once": False,
+        }
+        for name, value in scope["headers"]:
+            name = name.decode("latin-1").upper().replace("-", "_")
+            value = value.decode("latin-1")
+            if name == "CONTENT_TYPE":
+                environ["CONTENT_TYPE"] = value
+            elif name != "CONTENT_LENGTH":
+                key = f"HTTP_{name}"
+                environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+
+wsgi = WSGIBridge(flask_app, ASGI_WSGI_THREADS)
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                wsgi.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    if scope["type"] != "http":
+        return
+
+    handler = ASYNC_ROUTES.get((scope["method"], scope["path"]))
+    if handler is not None:
+        await handler(scope, receive, send)
+    else:
+        await wsgi(scope, receive, send)
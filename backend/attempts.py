@@ -0,0 +1,84 @@
+import os
+import time
+
+from backend.shared_store import get_store
+
+# Failed-login limiter. Once a client IP or a target email has too many failures inside
+# the window, further attempts are refused before any password is hashed, so brute-force
+# traffic costs a store lookup instead of a KDF run. Counts live in the shared store, so
+# every worker process enforces the same limit.
+
+LOGIN_ATTEMPT_WINDOW = int(os.environ.get("LOGIN_ATTEMPT_WINDOW", 300))  # seconds
+LOGIN_MAX_FAILURES_PER_IP = int(os.environ.get("LOGIN_MAX_FAILURES_PER_IP", 30))
+LOGIN_MAX_FAILURES_PER_EMAIL = int(os.environ.get("LOGIN_MAX_FAILURES_PER_EMAIL", 5))
+
+
+class AttemptLimiter:
+    """
+    Sliding-window event counter per key; a key is blocked once it reaches limit events.
+    The window is estimated from two fixed windows, the previous one weighted by how
+    much of it still overlaps, which takes two counters per key instead of a timestamp
+    per event.
+    """
+
+    def __init__(self, name, limit, window):
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self.blocked_count = 0
+
+    def _buckets(self, key, now):
+        bucket = int(now // self.window)
+        return f"limit:{self.name}:{key}:{bucket}", f"limit:{self.name}:{key}:{bucket - 1}"
+
+    def count(self, key):
+        now = time.time()
+        current, previous = self._buckets(key, now)
+        store = get_store()
+        overlap = 1 - (now % self.window) / self.window
+        return (store.get(current) or 0) + (store.get(previous) or 0) * overlap
+
+    def retry_after(self, key):
+        """Seconds until key may try again; 0 when it is not blocked."""
+        if self.count(key) < self.limit:
+            return 0
+        self.blocked_count += 1
+        return max(1, int(self.window - time.time() % self.window) + 1)
+
+    def record(self, key):
+        current, _ = self._buckets(key, time.time())
+        get_store().incr(current, ttl=2 * self.window)
+
+    def reset(self, key):
+        store = get_store()
+        for bucket in self._buckets(key, time.time()):
+            store.delete(bucket)
+
+    def stats(self):
+        return {"blocked": self.blocked_count}
+
+
+by_ip = AttemptLimiter("login-ip", LOGIN_MAX_FAILURES_PER_IP, LOGIN_ATTEMPT_WINDOW)
+by_email = AttemptLimiter("login-email", LOGIN_MAX_FAILURES_PER_EMAIL, LOGIN_ATTEMPT_WINDOW)
+
+
+def retry_after(ip, email):
+    return max(by_ip.retry_after(ip), by_email.retry_after(email.strip().lower()))
+
+
+def suspect(ip, email):
+    """True when the client or the account has failed recently."""
+    return bool(by_ip.count(ip) or by_email.count(email.strip().lower()))
+
+
+def record_failure(ip, email):
+    by_ip.record(ip)
+    by_email.record(email.strip().lower())
+
+
+def record_success(email):
+    by_email.reset(email.strip().lower())
+
+
+def stats():
+    return {"ip": by_ip.stats(), "email": by_email.stats()}
@@ -1,30 +1,57 @@
 from sqlite3 import IntegrityError
 from flask import request, jsonify, Blueprint
-from werkzeug.security import check_password_hash, generate_password_hash
 from flask_login import login_user, logout_user, login_required
 
+from backend import attempts, passwords
 from backend.models import User, db
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
 
 @auth_bp.route('/login', methods=['POST'])
 def login():
-    data = request.get_json()
-    email = data['email']
-    password = data['password']
+    data = request.get_json() or {}
+    if not isinstance(data, dict):
+        return jsonify({"message": "Invalid request body"}), 400
+    email = data.get('email')
+    password = data.get('password')
 
     if not email or not password:
         return jsonify({"message": "Email password are required"}), 401
+    # The attempt limiter and the hash check expect text
+    if not isinstance(email, str) or not isinstance(password, str):
+        return jsonify({"message": "Email and password must be strings"}), 400
+
+    # Refuse over-limit clients before any lookup or hashing
+    ip = request.remote_addr or ""
+    retry_after = attempts.retry_after(ip, email)
+    if retry_after:
+        return jsonify({"message": "Too many login attempts, try again later"}), 429, {"Retry-After": str(retry_after)}
 
     user = User.query.filter_by(email=email).first()
-    username = user.name
     if not user:
+        attempts.record_failure(ip, email)
         return jsonify({"message": "User not found"}), 401
-    if not check_password_hash(user.password, password):
+
+    suspect = attempts.suspect(ip, email)
+    try:
+        ok, upgraded_hash = passwords.verify_password(user.password, password, suspect=suspect)
+    except passwords.HashingBusy:
+        if suspect:
+            # Still an attempt: a failing client retrying into a full queue reaches the limit
+            attempts.record_failure(ip, email)
+        return jsonify({"message": "Server is busy, try again shortly"}), 503, {"Retry-After": "1"}
+    if not ok:
+        attempts.record_failure(ip, email)
         return jsonify({"message": "Password is incorrect"}), 401
 
+    attempts.record_success(email)
+    if upgraded_hash:
+        # Stored hash used an older method or cost; replace it now that we know the password
+        user.password = upgraded_hash
+        db.session.commit()
+
     login_user(user, remember=True)
-    return jsonify({"message": "Login successful", "username": username}), 200
+    return jsonify({"message": "Login successful", "username": user.name}), 200
 
 @auth_bp.route('/logout', methods=['POST'])
 def logout():
@@ -44,11 +71,16 @@ def register():
     if User.query.filter_by(email=email).first():
         return jsonify({"message": "User with this email already registered"}), 400
 
+    try:
+        password_hash = passwords.hash_password(password)
+    except passwords.HashingBusy:
+        return jsonify({"message": "Server is busy, try again shortly"}), 503, {"Retry-After": "1"}
+
     try:
         user = User(
             name=username,
             email=email,
-            password=generate_password_hash(password),
+            password=password_hash,
         )
         db.session.add(user)
         db.session.commit()
@@ -0,0 +1,289 @@
+"""
+Load and latency benchmark for the Flask app, run against the fake Gemini backend.
+
+    python -m backend.bench --users 50 --concurrency 10 --token-latency 0.002 --out bench.json
+    python -m backend.bench --compare bench.json
+
+Each virtual user walks the main flow (register, login, generate-quiz, submit, get-skill,
+complete-step, profile) through its own in-process client, against a throwaway SQLite
+database. Per-endpoint latency percentiles, requests per second and SQL statement counts
+(from the X-Query-Count header) are printed and saved as JSON.
+
+    python -m backend.bench --scenario login-storm --users 200 --attackers 16
+
+The login-storm scenario measures legitimate logins while attacker threads, each from
+its own client IP, hammer /auth/login with wrong passwords for the whole run.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+DEFAULT_SKILLS = "python,java,sql,react,docker"
+
+
+def percentile(sorted_values, pct):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def record(self, endpoint, seconds, status, queries):
+        with self.lock:
+            entry = self.samples.setdefault(endpoint, {"latencies": [], "statuses": {}, "queries": []})
+            entry["latencies"].append(seconds)
+            entry["statuses"][status] = entry["statuses"].get(status, 0) + 1
+            if queries is not None:
+                entry["queries"].append(queries)
+
+    def summary(self, duration):
+        endpoints = {}
+        for endpoint, entry in sorted(self.samples.items()):
+            latencies = sorted(entry["latencies"])
+            queries = entry["queries"]
+            errors = sum(n for status, n in entry["statuses"].items() if status >= 400)
+            endpoints[endpoint] = {
+                "count": len(latencies),
+                "errors": errors,
+                "statuses": {str(status): n for status, n in sorted(entry["statuses"].items())},
+                "rps": round(len(latencies) / duration, 2) if duration else 0.0,
+                "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+                "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+                "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+                "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+                "max_ms": round(latencies[-1] * 1000, 2),
+                "queries_mean": round(sum(queries) / len(queries), 2) if queries else None,
+                "queries_max": max(queries) if queries else None,
+            }
+        total = sum(e["count"] for e in endpoints.values())
+        return {
+            "requests": total,
+            "errors": sum(e["errors"] for e in endpoints.values()),
+            "duration_s": round(duration, 3),
+            "rps": round(total / duration, 2) if duration else 0.0,
+            "endpoints": endpoints,
+        }
+
+
+def _call(client, recorder, endpoint, method, url, **kwargs):
+    started = time.perf_counter()
+    response = getattr(client, method)(url, **kwargs)
+    elapsed = time.perf_counter() - started
+    queries = response.headers.get("X-Query-Count")
+    recorder.record(endpoint, elapsed, response.status_code, int(queries) if queries else None)
+    return response
+
+
+def user_flow(app, recorder, user_number, skills, seed, think_time=0.0):
+    """One user's journey; returns True when every step succeeded."""
+    rng = random.Random(seed + user_number)
+    client = app.test_client()
+    email = f"bench-{seed}-{user_number}@example.com"
+    skill = skills[user_number % len(skills)]
+
+    _call(client, recorder, "POST /auth/register", "post", "/auth/register",
+          json={"username": f"bench{user_number}", "email": email, "password": "bench-password"})
+    _call(client, recorder, "POST /auth/login", "post", "/auth/login",
+          json={"email": email, "password": "bench-password"})
+
+    quiz = _call(client, recorder, "GET /api/generate-quiz/<skill>", "get", f"/api/generate-quiz/{skill}")
+    if quiz.status_code != 200:
+        return False
+    # A repeat poll, as the frontend does, exercises the conditional GET path
+    _call(client, recorder, "GET /api/generate-quiz/<skill> (revalidate)", "get", f"/api/generate-quiz/{skill}",
+          headers={"If-None-Match": quiz.headers.get("ETag", "")})
+    # Time spent answering the questions
+    if think_time:
+        time.sleep(think_time)
+
+    submitted = _call(client, recorder, "POST /api/submit", "post", "/api/submit",
+                      json={"skill": skill, "score": rng.randint(0, 10)})
+    if submitted.status_code != 200:
+        return False
+
+    path = _call(client, recorder, "GET /api/get-skill", "get", "/api/get-skill")
+    if path.status_code != 200:
+        return False
+    steps = path.get_json()["steps"]
+    for step in steps[:rng.randint(1, len(steps))] if steps else []:
+        _call(client, recorder, "POST /api/complete-step/<id>", "post", f"/api/complete-step/{step['id']}")
+
+    profile = _call(client, recorder, "GET /profile/", "get", "/profile/")
+    _call(client, recorder, "GET /profile/ (revalidate)", "get", "/profile/",
+          headers={"If-None-Match": profile.headers.get("ETag", "")})
+    return profile.status_code == 200
+
+
+def login_storm(app, recorder, args):
+    """Legitimate logins under brute-force load; returns one outcome per legitimate login."""
+    password = "bench-password"
+    legit = [f"storm-{args.seed}-{n}@example.com" for n in range(max(1, args.users // 10))]
+    victims = [f"victim-{args.seed}-{n}@example.com" for n in range(max(1, args.attackers))]
+    setup = app.test_client()
+    for n, email in enumerate(legit + victims):
+        setup.post("/auth/register", json={"username": f"storm{n}", "email": email, "password": password})
+
+    stop = threading.Event()
+
+    def attack(number):
+        client = app.test_client()
+        ip = f"10.0.{number // 250}.{number % 250 + 1}"
+        victim = victims[number % len(victims)]
+        interval = args.attackers / args.attack_rps if args.attack_rps > 0 else 0.0
+        while not stop.is_set():
+            _call(client, recorder, "POST /auth/login (attack)", "post", "/auth/login",
+                  json={"email": victim, "password": "wrong-password"}, environ_base={"REMOTE_ADDR": ip})
+            stop.wait(interval)
+
+    def login(number):
+        client = app.test_client()
+        response = _call(client, recorder, "POST /auth/login", "post", "/auth/login",
+                         json={"email": legit[number % len(legit)], "password": password})
+        return response.status_code == 200
+
+    attackers = [threading.Thread(target=attack, args=(n,), daemon=True) for n in range(args.attackers)]
+    for thread in attackers:
+        thread.start()
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            return list(pool.map(login, range(args.users)))
+    finally:
+        stop.set()
+        for thread in attackers:
+            thread.join()
+
+
+def run(args):
+    # Configuration is read at import time, so the environment is set before the app loads
+    db_dir = tempfile.mkdtemp(prefix="suggestify-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(db_dir, 'bench.db')}"
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["QUERY_COUNT_HEADER"] = "1"
+    os.environ["LLM_RATE_LIMIT"] = str(args.llm_rpm)
+    os.environ["LLM_SPECULATIVE_RATE_LIMIT"] = str(args.llm_rpm)
+    os.environ["LLM_MAX_CONCURRENCY"] = str(args.llm_concurrency)
+    os.environ.setdefault("GEMINI_API_KEY", "bench")
+    if args.prefetch:
+        os.environ["PATH_PREFETCH"] = "1"
+
+    from backend import llm, migrations
+    from backend.app import create_app
+
+    app = create_app()
+    with app.app_context():
+        migrations.create_schema()
+
+    llm.set_backend(llm.FakeBackend(
+        token_latency=args.token_latency,
+        first_token_latency=args.first_token_latency,
+        chunk_size=args.chunk_size,
+    ))
+
+    skills = [s.strip() for s in args.skills.split(",") if s.strip()]
+    recorder = Recorder()
+    started = time.perf_counter()
+    if args.scenario == "login-storm":
+        outcomes = login_storm(app, recorder, args)
+    else:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            outcomes = list(pool.map(
+                lambda n: user_flow(app, recorder, n, skills, args.seed, args.think_time), range(args.users)))
+    duration = time.perf_counter() - started
+
+    return {
+        "generated_at": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "config": {
+            "scenario": args.scenario,
+            "users": args.users,
+            "attackers": args.attackers,
+            "attack_rps": args.attack_rps,
+            "concurrency": args.concurrency,
+            "skills": skills,
+            "token_latency": args.token_latency,
+            "first_token_latency": args.first_token_latency,
+            "chunk_size": args.chunk_size,
+            "llm_rpm": args.llm_rpm,
+            "llm_concurrency": args.llm_concurrency,
+            "seed": args.seed,
+            "think_time": args.think_time,
+            "prefetch": args.prefetch,
+        },
+        "flows_completed": sum(outcomes),
+        "flows_failed": len(outcomes) - sum(outcomes),
+        **recorder.summary(duration),
+    }
+
+
+def print_report(result, baseline=None):
+    print(f"{result['requests']} requests in {result['duration_s']}s "
+          f"({result['rps']} req/s), {result['flows_completed']} flows ok, {result['flows_failed']} failed")
+    header = f"{'endpoint':<46} {'n':>5} {'err':>4} {'p50':>8} {'p95':>8} {'p99':>8} {'rps':>8} {'sql':>6}"
+    if baseline:
+        header += f" {'p95 vs base':>12}"
+    print(header)
+    for endpoint, stats in result["endpoints"].items():
+        line = (f"{endpoint:<46} {stats['count']:>5} {stats['errors']:>4} {stats['p50_ms']:>8} "
+                f"{stats['p95_ms']:>8} {stats['p99_ms']:>8} {stats['rps']:>8} "
+                f"{stats['queries_mean'] if stats['queries_mean'] is not None else '-':>6}")
+        if baseline:
+            base = baseline["endpoints"].get(endpoint)
+            if base and base["p95_ms"]:
+                line += f" {(stats['p95_ms'] - base['p95_ms']) / base['p95_ms'] * 100:>+11.1f}%"
+            else:
+                line += f" {'new':>12}"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark SuggestiFy against a fake Gemini backend.")
+    parser.add_argument("--scenario", choices=("flow", "login-storm"), default="flow")
+    parser.add_argument("--users", type=int, default=20,
+                        help="virtual users, each running the flow once (login-storm: legitimate logins)")
+    parser.add_argument("--concurrency", type=int, default=5, help="users running at the same time")
+    parser.add_argument("--attackers", type=int, default=8, help="login-storm: brute-force threads, one IP each")
+    parser.add_argument("--attack-rps", type=float, default=200,
+                        help="login-storm: combined attack request rate (0 = as fast as possible)")
+    parser.add_argument("--skills", default=DEFAULT_SKILLS, help="comma-separated skills users pick from")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="seconds between streamed chunks")
+    parser.add_argument("--first-token-latency", type=float, default=0.0, help="seconds before the first chunk")
+    parser.add_argument("--chunk-size", type=int, default=16, help="characters per streamed chunk")
+    parser.add_argument("--llm-rpm", type=float, default=100000, help="model rate limit, requests per minute")
+    parser.add_argument("--llm-concurrency", type=int, default=16, help="concurrent model calls per model")
+    parser.add_argument("--think-time", type=float, default=0.0, help="seconds a user spends answering the quiz")
+    parser.add_argument("--prefetch", action="store_true", help="prefetch learning paths while the quiz is answered")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="a previous results file to compare p95 latency against")
+    args = parser.parse_args(argv)
+
+    result = run(args)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.out}")
+    return 0 if result["flows_failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+Cold-start benchmark: how long a fresh worker process takes to import the app, build it
+and answer its first request.
+
+    python -m backend.bench_startup --runs 10 --out startup.json
+    python -m backend.bench_startup --root /path/to/older/checkout --out before.json
+    python -m backend.bench_startup --compare before.json
+
+Every run is a new interpreter against its own empty SQLite database. --root measures
+another checkout of the repository with this script, so two revisions can be compared.
+--no-key runs without GEMINI_API_KEY, which must not stop the app from serving /health.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child; older revisions build the app at import time and have no create_app()
+PROBE = """
+import json, sys, time
+result = {}
+try:
+    started = time.perf_counter()
+    import backend.app as module
+    imported = time.perf_counter()
+    app = module.create_app() if hasattr(module, "create_app") else module.app
+    built = time.perf_counter()
+    result["health"] = app.test_client().get("/health").status_code
+    served = time.perf_counter()
+    result.update(
+        import_ms=(imported - started) * 1000,
+        boot_ms=(built - imported) * 1000,
+        first_request_ms=(served - built) * 1000,
+    )
+except Exception as e:
+    result["error"] = f"{type(e).__name__}: {e}"
+result["genai_loaded"] = "google.genai" in sys.modules
+result["modules"] = len(sys.modules)
+print(json.dumps(result))
+"""
+
+FIELDS = ("process_ms", "import_ms", "boot_ms", "first_request_ms")
+
+
+def probe(root, with_key):
+    db_dir = tempfile.mkdtemp(prefix="suggestify-startup-")
+    env = dict(os.environ)
+    env["DATABASE_URL"] = f"sqlite:///{os.path.join(db_dir, 'startup.db')}"
+    env["PYTHONPATH"] = root
+    env["QUIZ_BANK_WARM_INTERVAL"] = "0"
+    if with_key:
+        env.setdefault("GEMINI_API_KEY", "bench")
+    else:
+        env.pop("GEMINI_API_KEY", None)
+
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", PROBE], cwd=root, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    try:
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        result = {"error": (proc.stderr.strip().splitlines() or ["no output"])[-1]}
+    result["process_ms"] = elapsed * 1000
+    return result
+
+
+def run(args):
+    samples = [probe(args.root, not args.no_key) for _ in range(args.runs)]
+    ok = [s for s in samples if "error" not in s]
+    summary = {}
+    for field in FIELDS:
+        values = sorted(s[field] for s in ok)
+        if values:
+            summary[field] = {"median": round(statistics.median(values), 1), "min": round(values[0], 1)}
+
+    return {
+        "generated_at": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "config": {"root": args.root, "runs": args.runs, "gemini_api_key": not args.no_key},
+        "summary": summary,
+        "failed": len(samples) - len(ok),
+        "errors": sorted({s["error"] for s in samples if "error" in s}),
+        "health": sorted({s["health"] for s in ok}),
+        "genai_loaded": any(s["genai_loaded"] for s in samples),
+        "modules": max(s["modules"] for s in samples),
+    }
+
+
+def print_report(result, baseline=None):
+    print(f"{result['config']['runs']} cold starts of {result['config']['root']}, "
+          f"GEMINI_API_KEY {'set' if result['config']['gemini_api_key'] else 'unset'}")
+    header = f"{'phase':<18} {'median':>9} {'min':>9}"
+    if baseline:
+        header += f" {'median vs base':>15}"
+    print(header)
+    for field in FIELDS:
+        stats = result["summary"].get(field)
+        if stats is None:
+            continue
+        line = f"{field:<18} {stats['median']:>9} {stats['min']:>9}"
+        if baseline:
+            base = baseline["summary"].get(field)
+            if base and base["median"]:
+                line += f" {(stats['median'] - base['median']) / base['median'] * 100:>+14.1f}%"
+            else:
+                line += f" {'new':>15}"
+        print(line)
+    print(f"/health status: {result['health'] or '-'}   google.genai imported: {result['genai_loaded']}   "
+          f"modules loaded: {result['modules']}")
+    if result["failed"]:
+        print(f"{result['failed']} run(s) failed: {'; '.join(result['errors'])}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure SuggestiFy worker cold-start time.")
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes to start")
+    parser.add_argument("--root", default=ROOT, help="repository checkout to measure")
+    parser.add_argument("--no-key", action="store_true", help="start without GEMINI_API_KEY")
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="a previous results file to compare median times against")
+    args = parser.parse_args(argv)
+    args.root = os.path.abspath(args.root)
+
+    result = run(args)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.out}")
+    return 0 if not result["failed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+import os
+import re
+import uuid
+from datetime import datetime
+
+from backend.models import db, ChatSession, ChatTurn
+from backend.persistence import load_learning_path
+
+# Server-side chat sessions for /service/chat-gemini-stream.
+#
+# Each turn is sent as: a stable prefix (system prompt + the user's learning path topics,
+# served from a Gemini context cache where possible), the compacted summary of older turns,
+# the recent turns kept verbatim, then the new message. Once the verbatim history exceeds
+# CHAT_HISTORY_TOKEN_BUDGET (or CHAT_MAX_TURNS), its oldest turns are folded into the summary.
+
+CHAT_HISTORY_TOKEN_BUDGET = int(os.environ.get("CHAT_HISTORY_TOKEN_BUDGET", 2000))
+CHAT_MAX_TURNS = int(os.environ.get("CHAT_MAX_TURNS", 20))
+CHAT_SUMMARY_TOKEN_BUDGET = int(os.environ.get("CHAT_SUMMARY_TOKEN_BUDGET", 500))
+# Each folded turn keeps at most this many characters in the summary
+CHAT_SUMMARY_LINE_CHARS = int(os.environ.get("CHAT_SUMMARY_LINE_CHARS", 200))
+
+SYSTEM_PROMPT = """You are SuggestiFy's learning assistant.
+Answer the learner's questions clearly and concisely, with short examples where they help.
+When the learner is following a learning path, relate your answers to its topics."""
+
+
+class ChatSessionNotFound(LookupError):
+    pass
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English text; good enough for budgeting
+    return max(1, len(text) // 4)
+
+
+def system_prefix(path):
+    """The stable part of every prompt for a user: changes only when their learning path does."""
+    if path is None:
+        return SYSTEM_PROMPT
+
+    lines = [SYSTEM_PROMPT, "", f"The learner is studying {path['skill']} at {path['level']} level."]
+    lines.append("Their learning path topics:")
+    for topic in path["learning_path"]["topics"]:
+        description = topic.get("description")
+        lines.append(f"- {topic['name']}: {description}" if description else f"- {topic['name']}")
+    return "\n".join(lines)
+
+
+def skill_context(path):
+    return f"{path['skill']}:{path['level']}" if path else ""
+
+
+def _summary_line(turn):
+    text = " ".join(turn.text.split())
+    # Keep the first sentence of an answer; questions are usually short enough as they are
+    if turn.role == "model":
+        text = re.split(r"(?<=[.!?])\s", text, maxsplit=1)[0]
+    if len(text) > CHAT_SUMMARY_LINE_CHARS:
+        text = text[:CHAT_SUMMARY_LINE_CHARS].rstrip() + "..."
+    return f"{'Learner' if turn.role == 'user' else 'Assistant'}: {text}"
+
+
+def _compact(session):
+    """Folds the oldest verbatim turns into the session summary until the history fits the budget."""
+    turns = list(session.turns)
+    total = sum(turn.tokens for turn in turns)
+    folded = []
+    # Always keep the latest exchange verbatim
+    while len(turns) > 2 and (total > CHAT_HISTORY_TOKEN_BUDGET or len(turns) > CHAT_MAX_TURNS):
+        turn = turns.pop(0)
+        total -= turn.tokens
+        folded.append(turn)
+    if not folded:
+        return
+
+    lines = [line for line in session.summary.split("\n") if line]
+    lines.extend(_summary_line(turn) for turn in folded)
+    # The summary is bounded too: the oldest lines go first
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > CHAT_SUMMARY_TOKEN_BUDGET:
+        lines.pop(0)
+    session.summary = "\n".join(lines)
+    for turn in folded:
+        session.turns.remove(turn)
+
+
+def get_session(user_id, session_id):
+    session = db.session.get(ChatSession, session_id) if session_id else None
+    if session is None or session.user_id != user_id:
+        raise ChatSessionNotFound(session_id)
+    return session
+
+
+def _content(role, text):
+    # Plain dicts are accepted by google.genai, so building a prompt does not import it
+    return {"role": role, "parts": [{"text": text}]}
+
+
+def open_turn(user_id, session_id, message):
+    """
+    Records the user's message and returns (session_id, contents, system, cache_context) for
+    the model call; system is the learner's system prefix, turned into a model config only
+    when the model is actually called (see llm.prefix_config). A new session is started when
+    session_id is None. cache_context is the learner's skill context when the answer depends
+    on nothing else (no earlier turns), so it may be shared through the answer cache; None otherwise.
+    """
+    if session_id is None:
+        session = ChatSession(id=uuid.uuid4().hex, user_id=user_id, summary="")
+        db.session.add(session)
+    else:
+        session = get_session(user_id, session_id)
+
+    standalone = not session.summary and not session.turns
+    contents = []
+    if session.summary:
+        contents.append(_content("user", f"Summary of our earlier conversation:\n{session.summary}"))
+    for turn in session.turns:
+        contents.append(_content(turn.role, turn.text))
+    contents.append(_content("user", message))
+
+    session.turns.append(ChatTurn(role="user", text=message, tokens=estimate_tokens(message)))
+    session.updated_at = datetime.utcnow()
+    db.session.commit()
+
+    path = load_learning_path(user_id)
+    return session.id, contents, system_prefix(path), skill_context(path) if standalone else None
+
+
+def close_turn(session_id, answer):
+    """Stores the model's answer and compacts the history if it has outgrown its budget."""
+    session = db.session.get(ChatSession, session_id)
+    if session is None:
+        return
+    if answer:
+        session.turns.append(ChatTurn(role="model", text=answer, tokens=estimate_tokens(answer)))
+    _compact(session)
+    session.updated_at = datetime.utcnow()
+    db.session.commit()
@@ -1,26 +1,23 @@
-import os
-from dotenv import load_dotenv
-from google import genai
-from google.genai import types
 import json
 
-load_dotenv()
+from backend import llm, metrics
+from backend.json_stream import JSONItemStream, valid_question, valid_step_quiz, valid_topic
 
-def generate_learning_path(skill, skill_level):
-    """
-    Generates a structured JSON learning path for the given skill and skill level.
-    skill_level should be one of: "Beginner", "Intermediate", "Advanced"
-    """
+# Bump whenever the learning path prompt changes so cached paths are regenerated
+PATH_PROMPT_VERSION = "1"
+
+# Bump whenever the step quiz prompts change so stored step quizzes are regenerated
+STEP_QUIZ_PROMPT_VERSION = "1"
 
+# Model to use
+MODEL = "gemini-2.5-pro"
+
+
+def _learning_path_prompt(skill, skill_level):
     # Validate skill level
     if skill_level not in ["Beginner", "Intermediate", "Advanced"]:
         raise ValueError("skill_level must be 'Beginner', 'Intermediate', or 'Advanced'")
 
-    # Initialize Gemini client
-    client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
-    model = "gemini-2.5-pro"
-
-
     # Prompt for a specific skill level
     prompt_text = f"""
     Generate a structured JSON object representing a complete learning path for {skill}.
@@ -38,51 +35,49 @@ def generate_learning_path(skill, skill_level):
     Keep descriptions concise and clear.
     Output only valid JSON without extra commentary.
     """
+    return prompt_text.strip()
 
-    # Build request content
-    contents = [
-        types.Content(
-            role="user",
-            parts=[types.Part.from_text(text=prompt_text.strip())],
-        )
-    ]
-
-    config = types.GenerateContentConfig()
-
-    # Accumulate streamed chunks
-    output = ""
-    for chunk in client.models.generate_content_stream(
-        model=model,
-        contents=contents,
-        config=config,
-    ):
-        output += chunk.text
-
-    output = output.strip()
-    if output.startswith("```") and output.endswith("```"):
-        output = "\n".join(output.splitlines()[1:-1])
-
-    # Parse and return JSON
-    try:
-        data = json.loads(output)
-        return data
-    except json.JSONDecodeError:
-        print("Error: Invalid JSON received from API")
-        return output
 
-#result = generate_learning_path("Cybersecurity", "Beginner")
+def _stream_items(kind, prompt_text, validate, stream=None):
+    """Yields validated items from the model as they close, recording generation metrics under kind."""
+    stream = stream or JSONItemStream(validate)
+    with metrics.generation(kind) as timer:
+        for chunk in llm.stream_text(prompt_text, model=MODEL):
+            timer.chunk(chunk)
+            with timer.parsing():
+                items = stream.feed(chunk)
+            timer.items += len(items)
+            timer.rejected = stream.rejected
+            yield from items
 
 
-def generate_quiz(skill):
-    """Generates a basic-level quiz with 10 questions in JSON format."""
+def stream_learning_path(skill, skill_level):
+    """Yields each topic of a freshly generated learning path as soon as the model finishes it."""
+    prompt_text = _learning_path_prompt(skill, skill_level)
+    yield from _stream_items("learning_path", prompt_text, valid_topic)
 
-    # Initialize Gemini client
-    client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
 
-    # Model to use
-    model = "gemini-2.5-pro"
+def generate_learning_path(skill, skill_level):
+    """
+    Generates a structured JSON learning path for the given skill and skill level.
+    skill_level should be one of: "Beginner", "Intermediate", "Advanced"
+    """
+    prompt_text = _learning_path_prompt(skill, skill_level)
+
+    # Decode topics while the response streams in
+    stream = JSONItemStream(valid_topic)
+    topics = list(_stream_items("learning_path", prompt_text, valid_topic, stream))
+
+    if not topics:
+        print("Error: Invalid JSON received from API")
+        return stream.text()
+
+    return {"skill": skill, "level": skill_level, "topics": topics}
+
+#result = generate_learning_path("Cybersecurity", "Beginner")
 
 
+def _quiz_prompt(skill, variant=0):
     # User prompt content
     prompt_text = f"""
         Generate a structured JSON array containing 10 multiple-choice questions about {skill}.
@@ -101,37 +96,27 @@ def generate_quiz(skill):
         - "answer" should exactly match one of the option keys (e.g., "option1", "option2", etc.).
         - Output only valid JSON without any additional commentary.
         """
+    if variant:
+        prompt_text += f"""- This is alternate question set #{variant + 1}; cover different sub-topics than a standard {skill} quiz.
+        """
+    return prompt_text.strip()
 
-    # Build request content
-    contents = [
-        types.Content(
-            role="user",
-            parts=[types.Part.from_text(text=prompt_text.strip())],
-        )
-    ]
-
-    # Generate content configuration
-    config = types.GenerateContentConfig()
-
-    full_text =""
-    for chunk in client.models.generate_content_stream(
-        model=model,
-        contents=contents,
-        config=config,
-    ):
-        full_text += chunk.text
 
-    return full_text
+def stream_quiz(skill, variant=0):
+    """
+    Yields validated quiz questions (dicts) as soon as each one is complete.
+    variant > 0 asks for an alternate question set so the quiz bank can rotate between sets.
+    """
+    prompt_text = _quiz_prompt(skill, variant)
+    yield from _stream_items("quiz", prompt_text, valid_question)
 
 
-def generate_step_quiz(step_name):
-    # Initialize Gemini client
-    client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
-
-    # Model to use
-    model = "gemini-2.5-pro"
+def generate_quiz(skill, variant=0):
+    """Generates a basic-level quiz and returns up to 10 validated questions."""
+    return list(stream_quiz(skill, variant))[:10]
 
 
+def _step_quiz_prompt(step_name):
     # User prompt content
     prompt_text = f"""
            Generate a structured JSON array containing 10 basic-level multiple-choice questions about {step_name} at advanced level.
@@ -151,28 +136,53 @@ def generate_step_quiz(step_name):
            - "answer" should exactly match one of the option keys (e.g., "option1", "option2", etc.).
            - Output only valid JSON without any additional commentary.
            """
+    return prompt_text.strip()
 
-    # Build request content
-    contents = [
-        types.Content(
-            role="user",
-            parts=[types.Part.from_text(text=prompt_text.strip())],
-        )
-    ]
 
-    # Generate content configuration
-    config = types.GenerateContentConfig()
+def stream_step_quiz(step_name):
+    prompt_text = _step_quiz_prompt(step_name)
+    yield from _stream_items("step_quiz", prompt_text, valid_question)
 
-    full_text = ""
-    for chunk in client.models.generate_content_stream(
-            model=model,
-            contents=contents,
-            config=config,
-    ):
-        full_text += chunk.text
 
-    return full_text
+def generate_step_quiz(step_name):
+    return list(stream_step_quiz(step_name))[:10]
 
-#print(generate_learning_path("Python", "Advanced"))
+
+def _step_quizzes_prompt(step_names):
+    # One prompt for several steps; the step names come back verbatim so sets can be matched up
+    prompt_text = f"""
+           Generate quiz sets for these learning steps: {json.dumps(step_names)}
+           Return a structured JSON array with one object per step, in the same order:
+           {{
+             "step": "The step name, copied exactly from the list",
+             "questions": [
+               {{
+                 "question": "Question text here",
+                 "option1": "Option text here",
+                 "option2": "Option text here",
+                 "option3": "Option text here",
+                 "option4": "Option text here",
+                 "answer": "The correct option number (e.g., option2)"
+               }}
+             ]
+           }}
+           Requirements:
+           - Exactly 10 beginner-friendly multiple-choice questions per step.
+           - Options must be concise and plausible.
+           - "answer" should exactly match one of the option keys (e.g., "option1", "option2", etc.).
+           - Output only valid JSON without any additional commentary.
+           """
+    return prompt_text.strip()
 
 
+def stream_step_quizzes(step_names):
+    """
+    Generates quizzes for several steps with a single prompt, yielding (step name, questions)
+    as soon as each step's set is complete. Steps the model skips are simply not yielded.
+    """
+    prompt_text = _step_quizzes_prompt(step_names)
+    for item in _stream_items("step_quiz_batch", prompt_text, valid_step_quiz):
+        questions = [q for q in item["questions"] if isinstance(q, dict) and valid_question(q)]
+        yield item["step"], questions[:10]
+
+#print(generate_learning_path("Python", "Advanced"))
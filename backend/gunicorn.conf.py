@@ -0,0 +1,62 @@
+"""
+Production serving profile.
+
+    gunicorn -c backend/gunicorn.conf.py "backend.app:create_app()"
+    gunicorn -c backend/gunicorn.conf.py -k uvicorn.workers.UvicornWorker backend.asgi:app
+
+Worker processes share nothing in memory. Run more than one with SHARED_STORE_URL
+pointing at a store they all reach (sqlite:///path on one host, redis://... across
+hosts) so login limits, single-flight claims and cache hits hold across workers, and
+with a DATABASE_URL every node can reach.
+"""
+import multiprocessing
+import os
+
+_cpus = multiprocessing.cpu_count()
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", _cpus * 2 + 1))
+# Threads per worker; requests mostly wait on the model or the database
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+# SSE responses stay open for a whole generation
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 180))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+# Recycle workers now and then so slow leaks cannot accumulate
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 2000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 200))
+# Job, hashing and warm-up pools are started per worker, after the fork
+preload_app = False
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG", "-")
+
+# Workers read these when they import the app; split the hashing processes between them
+# rather than giving every worker half the machine
+os.environ.setdefault("PASSWORD_HASH_WORKERS", str(max(1, _cpus // 2 // workers)))
+
+
+def on_starting(server):
+    # Create and migrate the schema once in the master instead of racing in every worker
+    from dotenv import load_dotenv
+    from flask import Flask
+
+    # Before the backend imports: they read DATABASE_URL and SHARED_STORE_URL, which may be set
+    # only in .env, as create_app() would see them
+    load_dotenv()
+
+    from backend import database, migrations
+    from backend.models import db
+    from backend.shared_store import SHARED_STORE_URL
+
+    app = Flask("suggestify-migrate")
+    database.configure(app)
+    db.init_app(app)
+    with app.app_context():
+        for version, name in migrations.create_schema():
+            server.log.info("Applied migration %s: %s", version, name)
+        db.engine.dispose()
+
+    if workers > 1 and SHARED_STORE_URL.startswith("memory://"):
+        server.log.warning(
+            "SHARED_STORE_URL is memory://: login limits, prefetch budgets and response caches "
+            "are per worker. Point it at sqlite:///... or redis://... to share them.")
@@ -0,0 +1,118 @@
+import hashlib
+import os
+
+from flask import Response, request
+
+from backend import json_provider
+from backend.cache import LRUCache
+from backend.shared_store import get_store
+
+# Conditional GET for the read endpoints the frontend polls.
+#
+# Every cached response carries a strong ETag built from the row versions it was
+# rendered from (users.data_version for per-user payloads, the quiz bank's row ids for
+# quizzes). A matching If-None-Match gets an empty 304; otherwise the serialized body
+# is served from an in-process cache as long as its ETag is still current. Writers bump
+# the version in the same transaction as their change, so a stale body is never served,
+# and also drop the local entry so it does not linger until evicted. With a shared
+# store, rendered bodies are also kept there so every worker can serve them.
+
+HTTP_CACHE_SIZE = int(os.environ.get("HTTP_CACHE_SIZE", 2048))
+HTTP_CACHE_QUIZ_MAX_AGE = int(os.environ.get("HTTP_CACHE_QUIZ_MAX_AGE", 60))
+HTTP_CACHE_STEP_QUIZ_MAX_AGE = int(os.environ.get("HTTP_CACHE_STEP_QUIZ_MAX_AGE", 3600))
+# Rendered bodies in the shared store expire on their own; their ETags keep them correct
+HTTP_CACHE_SHARED_TTL = int(os.environ.get("HTTP_CACHE_SHARED_TTL", 3600))
+
+# Cache-Control per route. Per-user payloads must be revalidated on every poll (cheap
+# with a 304); a quiz set only changes with the quiz bank, so browsers may reuse it briefly,
+# and a stored step quiz never changes at all.
+CACHE_POLICIES = {
+    "profile": "private, no-cache",
+    "get-skill": "private, no-cache",
+    "quiz": f"private, max-age={HTTP_CACHE_QUIZ_MAX_AGE}",
+    "step-quiz": f"private, max-age={HTTP_CACHE_STEP_QUIZ_MAX_AGE}",
+}
+
+USER_SCOPES = ("profile", "get-skill")
+
+_rendered = LRUCache(maxsize=HTTP_CACHE_SIZE)
+_stats = {"not_modified": 0, "rendered_hits": 0, "shared_hits": 0, "renders": 0}
+
+
+def etag(*parts):
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+
+def _finish(response, tag, scope):
+    response.set_etag(tag)
+    response.headers["Cache-Control"] = CACHE_POLICIES[scope]
+    # Responses depend on the session cookie, so shared caches must key on it
+    response.vary.add("Cookie")
+    return response
+
+
+def not_modified(tags, scope):
+    """Returns a 304 for the first tag the client already holds, or None."""
+    for tag in tags:
+        if request.if_none_match.contains(tag):
+            _stats["not_modified"] += 1
+            return _finish(Response(status=304), tag, scope)
+    return None
+
+
+def cached_response(key, tag, scope):
+    """Answers from the client's copy or the rendered-response cache; None means render it."""
+    response = not_modified([tag], scope)
+    if response is not None:
+        return response
+
+    entry = _rendered.get(key)
+    if entry is None or entry[0] != tag:
+        entry = _shared_entry(key, tag)
+        if entry is None:
+            return None
+    _stats["rendered_hits"] += 1
+    return _finish(Response(entry[1], mimetype="application/json"), tag, scope)
+
+
+def _shared_key(key):
+    return "http:" + ":".join(str(part) for part in key)
+
+
+def _shared_entry(key, tag):
+    store = get_store()
+    if not store.shared:
+        return None
+    entry = store.get(_shared_key(key))
+    if entry is None or entry[0] != tag:
+        return None
+    _stats["shared_hits"] += 1
+    entry = tuple(entry)
+    _rendered.set(key, entry)
+    return entry
+
+
+def render(key, tag, payload, scope):
+    body = json_provider.dumpb(payload)
+    _rendered.set(key, (tag, body))
+    store = get_store()
+    if store.shared:
+        store.set(_shared_key(key), [tag, body.decode("utf-8")], ttl=HTTP_CACHE_SHARED_TTL)
+    _stats["renders"] += 1
+    return _finish(Response(body, mimetype="application/json"), tag, scope)
+
+
+def invalidate(key):
+    _rendered.delete(key)
+    store = get_store()
+    if store.shared:
+        store.delete(_shared_key(key))
+
+
+def invalidate_user(user_id):
+    for scope in USER_SCOPES:
+        invalidate((scope, user_id))
+
+
+def stats():
+    return {**_stats, "rendered": _rendered.stats()}
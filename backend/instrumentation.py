@@ -0,0 +1,78 @@
+import os
+import threading
+from contextlib import contextmanager
+
+from flask import g
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Adds an X-Query-Count header to every response; meant for tests and benchmarks
+QUERY_COUNT_HEADER = os.environ.get("QUERY_COUNT_HEADER", "").lower() in ("1", "true", "yes")
+
+_local = threading.local()
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    for counter in getattr(_local, "counters", ()):
+        counter.count += 1
+        counter.statements.append(statement)
+
+
+def _push(counter):
+    counters = getattr(_local, "counters", None)
+    if counters is None:
+        counters = _local.counters = []
+    counters.append(counter)
+
+
+def _pop(counter):
+    counters = getattr(_local, "counters", [])
+    if counter in counters:
+        counters.remove(counter)
+
+
+@contextmanager
+def count_queries():
+    """
+    Counts SQL statements run on the current thread inside the block:
+
+        with count_queries() as counter:
+            client.get("/profile/")
+        assert counter.count == 3
+    """
+    counter = QueryCounter()
+    _push(counter)
+    try:
+        yield counter
+    finally:
+        _pop(counter)
+
+
+def init_app(app):
+    if not QUERY_COUNT_HEADER:
+        return
+
+    @app.before_request
+    def _start_counting():
+        g.query_counter = QueryCounter()
+        _push(g.query_counter)
+
+    @app.after_request
+    def _report_count(response):
+        counter = g.get("query_counter")
+        if counter is not None:
+            response.headers["X-Query-Count"] = str(counter.count)
+        return response
+
+    @app.teardown_request
+    def _stop_counting(exc):
+        counter = g.pop("query_counter", None)
+        if counter is not None:
+            _pop(counter)
@@ -0,0 +1,221 @@
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import Blueprint, jsonify, url_for
+from flask_login import login_required, current_user
+from sqlalchemy.exc import OperationalError
+
+from backend import llm
+from backend.models import db, GenerationJob
+
+jobs_bp = Blueprint("jobs", __name__, url_prefix="/api")
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 4))
+# Speculative work (e.g. path prefetch) gets its own threads, so it never sits in
+# front of a job a user is waiting for
+JOB_BACKGROUND_WORKERS = int(os.environ.get("JOB_BACKGROUND_WORKERS", 1))
+JOB_MODEL_CONCURRENCY = int(os.environ.get("JOB_MODEL_CONCURRENCY", 2))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", 3))
+JOB_RETRY_BACKOFF = float(os.environ.get("JOB_RETRY_BACKOFF", 2.0))
+# Jobs left "running" longer than this are assumed to belong to a dead worker
+JOB_STALE_AFTER = int(os.environ.get("JOB_STALE_AFTER", 15 * 60))
+
+_handlers = {}
+_model_slots = {}
+_slots_lock = threading.Lock()
+_executor = None
+_background_executor = None
+_executor_lock = threading.Lock()
+_app = None
+
+
+def job_handler(kind, model, background=False):
+    """
+    Registers fn(payload) -> JSON-serializable result as the handler for a job kind.
+    Background jobs run on their own small pool instead of the one serving user requests.
+    """
+    def decorator(fn):
+        _handlers[kind] = (fn, model, background)
+        return fn
+    return decorator
+
+
+def _model_slot(model):
+    with _slots_lock:
+        if model not in _model_slots:
+            _model_slots[model] = threading.BoundedSemaphore(JOB_MODEL_CONCURRENCY)
+        return _model_slots[model]
+
+
+def _get_executor(background=False):
+    global _executor, _background_executor
+    with _executor_lock:
+        if background:
+            if _background_executor is None:
+                _background_executor = ThreadPoolExecutor(
+                    max_workers=JOB_BACKGROUND_WORKERS, thread_name_prefix="job-background")
+            return _background_executor
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job-worker")
+        return _executor
+
+
+def _submit(job_id, kind):
+    _get_executor(background=_handlers[kind][2]).submit(_run, job_id)
+
+
+def init_app(app):
+    """Binds the worker pool to the app and resumes jobs a previous process left behind."""
+    global _app
+    _app = app
+    # Off the boot path: the worker starts serving while the pool looks for leftovers
+    _get_executor().submit(_resume_pending)
+
+
+def _resume_pending():
+    # Runs on the pool, where an exception would vanish with the discarded future
+    with _app.app_context():
+        try:
+            stale_before = datetime.utcnow() - timedelta(seconds=JOB_STALE_AFTER)
+            pending = GenerationJob.query.filter(
+                (GenerationJob.status == "queued")
+                | ((GenerationJob.status == "running") & (GenerationJob.started_at < stale_before))
+            ).all()
+            for job in pending:
+                job.status = "queued"
+            db.session.commit()
+            pending = [(job.id, job.kind) for job in pending if job.kind in _handlers]
+        except Exception as e:
+            # e.g. the schema is not migrated yet, or the database is locked; the next
+            # process start tries again
+            db.session.rollback()
+            print(f"Could not resume pending generation jobs: {e}")
+            return
+
+    for job_id, kind in pending:
+        _submit(job_id, kind)
+
+
+def enqueue(kind, payload, user_id=None, max_attempts=JOB_MAX_ATTEMPTS):
+    if kind not in _handlers:
+        raise ValueError(f"Unknown job kind: {kind}")
+
+    job = GenerationJob(
+        id=uuid.uuid4().hex,
+        kind=kind,
+        user_id=user_id,
+        payload=payload,
+        status="queued",
+        max_attempts=max_attempts,
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    _submit(job.id, kind)
+    return job
+
+
+def _claim(job_id):
+    # Conditional update so only one worker (in any process) picks the job up
+    claimed = GenerationJob.query.filter_by(id=job_id, status="queued").update(
+        {"status": "running", "started_at": datetime.utcnow()}
+    )
+    db.session.commit()
+    return claimed == 1
+
+
+def _is_transient(e):
+    # Worth another attempt: model capacity or transport trouble, a locked or dropped database
+    return isinstance(e, (llm.LLMBusyError, OperationalError)) or llm.is_retryable(e)
+
+
+def _error_message(e, transient):
+    """What the job status endpoint shows; raw driver and SDK errors stay in the log."""
+    if transient:
+        return "Generation is temporarily unavailable; try again later"
+    if isinstance(e, ValueError):
+        # Handlers raise ValueError with a message meant for the user
+        return str(e)
+    return "Generation failed"
+
+
+def _run(job_id):
+    with _app.app_context():
+        if not _claim(job_id):
+            return
+
+        job = db.session.get(GenerationJob, job_id)
+        handler, model, _ = _handlers[job.kind]
+
+        while True:
+            job.attempts += 1
+            db.session.commit()
+            try:
+                with _model_slot(model):
+                    result = handler(job.payload)
+            except Exception as e:
+                db.session.rollback()
+                transient = _is_transient(e)
+                print(f"Job {job.id} ({job.kind}) attempt {job.attempts} failed: {type(e).__name__}: {e}")
+                job.error = _error_message(e, transient)
+                # Deterministic failures (bad model output, a conflicting row) fail at once
+                if not transient or job.attempts >= job.max_attempts:
+                    job.status = "failed"
+                    job.finished_at = datetime.utcnow()
+                    db.session.commit()
+                    return
+                db.session.commit()
+                # Exponential backoff with jitter before the next attempt
+                time.sleep(JOB_RETRY_BACKOFF * 2 ** (job.attempts - 1) * random.uniform(0.5, 1.5))
+                continue
+
+            job.status = "succeeded"
+            job.result = result
+            job.error = None
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            return
+
+
+def accepted_response(job):
+    return jsonify({
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": url_for("jobs.job_status", job_id=job.id),
+        "result_url": url_for("jobs.job_result", job_id=job.id),
+    }), 202
+
+
+def _get_own_job(job_id):
+    job = db.session.get(GenerationJob, job_id)
+    if not job or job.user_id != current_user.id:
+        return None
+    return job
+
+
+@jobs_bp.route("/jobs/<job_id>", methods=["GET"])
+@login_required
+def job_status(job_id):
+    job = _get_own_job(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+
+@jobs_bp.route("/jobs/<job_id>/result", methods=["GET"])
+@login_required
+def job_result(job_id):
+    job = _get_own_job(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    if job.status == "failed":
+        return jsonify({"error": job.error, "status": job.status}), 500
+    if job.status != "succeeded":
+        # Not ready yet; the client keeps polling
+        return jsonify(job.to_dict()), 202
+    return jsonify(job.result)
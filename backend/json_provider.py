@@ -0,0 +1,135 @@
+import json
+import os
+import re
+import secrets
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# JSON encoding for API responses.
+#
+# orjson encodes the large payloads (learning paths, quiz sets, result pages) several
+# times faster than the stdlib; without it, or with JSON_ENCODER=stdlib, the stdlib
+# is used. Either way the output matches Flask's own provider: keys sorted, dates as
+# HTTP dates, decimals as strings.
+#
+# Large payloads that never change once cached (a stored step quiz, a cached learning
+# path) are encoded once with fragment(obj) by the cache that holds them, and spliced
+# into later responses as bytes instead of being re-encoded on every render. Splicing
+# costs a little per fragment, so it only pays for big units: many small fragments
+# (single topics, say) encode faster with orjson as plain objects.
+
+JSON_ENCODER = os.environ.get("JSON_ENCODER", "auto").lower()
+
+USE_ORJSON = orjson is not None and JSON_ENCODER != "stdlib"
+if JSON_ENCODER == "orjson" and orjson is None:
+    raise RuntimeError("JSON_ENCODER=orjson but the orjson package is not installed")
+
+if USE_ORJSON:
+    _ORJSON_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+    _orjson_fragment = getattr(orjson, "Fragment", None)
+
+# Stands in for a fragment while the rest of the payload is encoded; the NUL and the
+# per-process token keep it from matching any real string
+_MARKER = f"\x00fragment-{secrets.token_hex(8)}-"
+_HOLE = re.compile(re.escape(json.dumps(_MARKER)[:-1].encode("ascii")) + rb'(\d+)"')
+
+
+class RawJSON:
+    """Already encoded JSON, written into the output as-is."""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = data
+
+
+def _default(obj):
+    if isinstance(obj, RawJSON):
+        # Nested below the level compose() splices at; decoded unless orjson can splice it
+        if USE_ORJSON and _orjson_fragment is not None:
+            return _orjson_fragment(obj.data)
+        return json.loads(obj.data)
+    return DefaultJSONProvider.default(obj)
+
+
+def _encode(obj):
+    if USE_ORJSON:
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+    return json.dumps(obj, default=_default, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def _is_composite(obj):
+    if isinstance(obj, dict):
+        return any(isinstance(value, RawJSON) for value in obj.values())
+    if isinstance(obj, list):
+        return any(isinstance(item, RawJSON) for item in obj)
+    return False
+
+
+def compose(obj):
+    """
+    Encodes a dict or list whose direct members may be RawJSON, splicing those in
+    as bytes. Nest compose() calls to place fragments deeper.
+    """
+    raws = []
+
+    def hole(value):
+        if isinstance(value, RawJSON):
+            raws.append(value.data)
+            return f"{_MARKER}{len(raws) - 1}"
+        return value
+
+    if isinstance(obj, dict):
+        shell = {key: hole(value) for key, value in obj.items()}
+    else:
+        shell = [hole(item) for item in obj]
+    # One encoder call for the shell, then one pass to swap each marker for its fragment
+    data = _encode(shell)
+    if raws:
+        data = _HOLE.sub(lambda match: raws[int(match.group(1))], data)
+    return RawJSON(data)
+
+
+def dumpb(obj):
+    """Encodes obj as compact UTF-8 JSON bytes."""
+    if isinstance(obj, RawJSON):
+        return obj.data
+    if _is_composite(obj):
+        return compose(obj).data
+    return _encode(obj)
+
+
+def fragment(obj):
+    """
+    obj encoded now, to be spliced into later responses. The caller keeps it next to obj
+    in the cache that owns obj, so it lives exactly as long as the cached object.
+    """
+    return RawJSON(_encode(obj))
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by dumpb(), so jsonify() and request.get_json() use orjson too."""
+
+    default = staticmethod(_default)
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumpb(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        if kwargs or not USE_ORJSON:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if self.compact is False or (self.compact is None and self._app.debug):
+            # Pretty-printed for debugging; fragments are decoded for that
+            return super().response(obj)
+        return self._app.response_class(dumpb(obj) + b"\n", mimetype=self.mimetype)
@@ -0,0 +1,126 @@
+import json
+
+QUESTION_FIELDS = ("question", "option1", "option2", "option3", "option4", "answer")
+ANSWER_KEYS = ("option1", "option2", "option3", "option4")
+
+
+def valid_question(obj):
+    if not all(isinstance(obj.get(field), str) and obj[field].strip() for field in QUESTION_FIELDS):
+        return False
+    return obj["answer"].strip() in ANSWER_KEYS
+
+
+def valid_step_quiz(obj):
+    # One step's set from a batched step quiz prompt; bad questions are dropped later
+    if not isinstance(obj.get("step"), str) or not obj["step"].strip():
+        return False
+    questions = obj.get("questions")
+    return isinstance(questions, list) and any(isinstance(q, dict) and valid_question(q) for q in questions)
+
+
+def valid_topic(obj):
+    if not isinstance(obj.get("name"), str) or not obj["name"].strip():
+        return False
+    if "description" in obj and not isinstance(obj["description"], str):
+        return False
+    resources = obj.get("resources", [])
+    return isinstance(resources, list) and all(isinstance(r, str) for r in resources)
+
+
+class JSONItemStream:
+    """
+    Incremental decoder for streamed model output.
+
+    Feed it chunks as they arrive; every object that is a direct element of an array
+    (a quiz question, a learning path topic) is decoded and returned as soon as its
+    closing brace is seen. Markdown code fences and any commentary outside the JSON
+    document are dropped on the fly. Every character is scanned exactly once.
+    """
+
+    def __init__(self, validate=None):
+        self.validate = validate
+        self.rejected = 0
+        self._parts = []
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._in_fence = False
+        self._item = None
+        self._item_depth = 0
+
+    def feed(self, chunk):
+        """Consumes one chunk and returns the list of complete items it finished."""
+        items = []
+        kept = []
+        for ch in chunk:
+            if self._in_fence:
+                # Inside a fence marker such as ```json; JSON may follow it on the same line
+                if ch == "`" or ch.isalnum() or ch in "-_+.":
+                    continue
+                self._in_fence = False
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == "`":
+                self._in_fence = True
+                continue
+            elif not self._stack and ch not in "{[":
+                # Commentary or whitespace outside the JSON document
+                continue
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if ch == "{" and self._item is None and self._stack and self._stack[-1] == "[":
+                    self._item = []
+                    self._item_depth = len(self._stack)
+                self._stack.append(ch)
+            elif ch in "}]":
+                if self._stack:
+                    self._stack.pop()
+
+            kept.append(ch)
+            if self._item is not None:
+                self._item.append(ch)
+                if ch == "}" and not self._in_string and len(self._stack) == self._item_depth:
+                    item = self._decode_item()
+                    if item is not None:
+                        items.append(item)
+
+        self._parts.append("".join(kept))
+        return items
+
+    def _decode_item(self):
+        raw = "".join(self._item)
+        self._item = None
+        try:
+            obj = json.loads(raw)
+        except json.JSONDecodeError:
+            self.rejected += 1
+            return None
+        if not isinstance(obj, dict) or (self.validate and not self.validate(obj)):
+            self.rejected += 1
+            return None
+        return obj
+
+    def text(self):
+        """The JSON text seen so far, without fences or commentary."""
+        return "".join(self._parts)
+
+    def document(self):
+        """Parses the complete document once the stream has ended; None if it is invalid."""
+        try:
+            return json.loads(self.text())
+        except json.JSONDecodeError:
+            return None
+
+
+def iter_items(chunks, validate=None):
+    """Yields validated array items from an iterable of text chunks as soon as each one closes."""
+    stream = JSONItemStream(validate)
+    for chunk in chunks:
+        yield from stream.feed(chunk)
@@ -0,0 +1,502 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from backend.cache import LRUCache
+
+# Shared Gemini access for every generator and the chat service. One client (and so one
+# pooled httpx connection set) is reused by all callers instead of one per request.
+#
+# The google-genai SDK (and httpx under it) takes most of a second to import, so it is
+# only imported when the Gemini backend is first used; workers that never call the model,
+# and the fake backend, do not pay for it.
+
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", 120))  # seconds
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", 20))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 3))
+LLM_RETRY_BASE_DELAY = float(os.environ.get("LLM_RETRY_BASE_DELAY", 1.0))
+LLM_RETRY_MAX_DELAY = float(os.environ.get("LLM_RETRY_MAX_DELAY", 20.0))
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 4))  # per model
+# Async streams wait on the network, not on a worker thread, so far more can be open at once
+LLM_ASYNC_MAX_CONCURRENCY = int(os.environ.get("LLM_ASYNC_MAX_CONCURRENCY", 256))  # per model
+LLM_QUEUE_TIMEOUT = float(os.environ.get("LLM_QUEUE_TIMEOUT", 60))
+LLM_RATE_LIMIT = float(os.environ.get("LLM_RATE_LIMIT", 60))  # requests per minute, per model
+LLM_RATE_BURST = int(os.environ.get("LLM_RATE_BURST", 5))
+# Per-model overrides, e.g. "gemini-2.5-pro=5,gemini-2.0-flash=120"
+LLM_RATE_LIMITS = os.environ.get("LLM_RATE_LIMITS", "")
+# Speculative calls (see speculative()) have a budget of their own, per model, and give up
+# instead of waiting when it is spent. Size it to what the provider quota can spare.
+LLM_SPECULATIVE_RATE_LIMIT = float(os.environ.get("LLM_SPECULATIVE_RATE_LIMIT", 10))  # per minute
+LLM_SPECULATIVE_CONCURRENCY = int(os.environ.get("LLM_SPECULATIVE_CONCURRENCY", 1))
+# Explicit context caching of stable prompt prefixes. Gemini rejects caches below a minimum
+# token count, so shorter prefixes are sent inline (and still benefit from implicit caching).
+LLM_CONTEXT_CACHE_TTL = int(os.environ.get("LLM_CONTEXT_CACHE_TTL", 3600))
+LLM_CONTEXT_CACHE_MIN_CHARS = int(os.environ.get("LLM_CONTEXT_CACHE_MIN_CHARS", 4096 * 4))
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class LLMBusyError(RuntimeError):
+    pass
+
+
+class TokenBucket:
+    """Blocking token bucket; rate is in tokens per second."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _take(self):
+        # Takes a token and returns 0, or returns how long until one is available
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if not wait:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    async def acquire_async(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if not wait:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+
+def genai_types():
+    """The google.genai types module, imported on first use."""
+    from google.genai import types
+    return types
+
+
+class GeminiBackend:
+    def __init__(self, api_key=None):
+        api_key = api_key or os.environ.get("GEMINI_API_KEY")
+        if not api_key:
+            raise RuntimeError("GEMINI_API_KEY not set in environment")
+
+        import httpx
+        from google import genai
+        types = genai_types()
+
+        limits = httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_CONNECTIONS,
+        )
+        self.client = genai.Client(
+            api_key=api_key,
+            http_options=types.HttpOptions(
+                timeout=int(LLM_TIMEOUT * 1000),
+                client_args={"limits": limits},
+                async_client_args={"limits": limits},
+            ),
+        )
+
+    @staticmethod
+    def _request(contents, config):
+        types = genai_types()
+        if isinstance(contents, str):
+            contents = [types.Content(role="user", parts=[types.Part.from_text(text=contents)])]
+        return contents, config or types.GenerateContentConfig()
+
+    def stream(self, model, contents, config):
+        contents, config = self._request(contents, config)
+        for chunk in self.client.models.generate_content_stream(
+            model=model,
+            contents=contents,
+            config=config,
+        ):
+            if chunk.text:
+                yield chunk.text
+
+    async def astream(self, model, contents, config):
+        contents, config = self._request(contents, config)
+        stream = await self.client.aio.models.generate_content_stream(
+            model=model,
+            contents=contents,
+            config=config,
+        )
+        async for chunk in stream:
+            if chunk.text:
+                yield chunk.text
+
+    def create_cache(self, model, system_instruction, ttl):
+        cached = self.client.caches.create(
+            model=model,
+            config=genai_types().CreateCachedContentConfig(
+                system_instruction=system_instruction,
+                ttl=f"{ttl}s",
+            ),
+        )
+        return cached.name
+
+
+class FakeBackend:
+    """
+    Deterministic local stand-in for Gemini used for load tests and offline development.
+    Answers quiz, step quiz and learning path prompts with valid JSON in the formats the generators ask for.
+    """
+
+    def __init__(self, token_latency=0.0, first_token_latency=0.0, chunk_size=16, respond=None):
+        self.token_latency = token_latency
+        self.first_token_latency = first_token_latency
+        self.chunk_size = chunk_size
+        self.respond = respond or fake_response
+
+    def stream(self, model, contents, config):
+        text = self.respond(model, prompt_text(contents))
+        if self.first_token_latency:
+            time.sleep(self.first_token_latency)
+        for start in range(0, len(text), self.chunk_size):
+            if self.token_latency:
+                time.sleep(self.token_latency)
+            yield text[start:start + self.chunk_size]
+
+    async def astream(self, model, contents, config):
+        text = self.respond(model, prompt_text(contents))
+        if self.first_token_latency:
+            await asyncio.sleep(self.first_token_latency)
+        for start in range(0, len(text), self.chunk_size):
+            if self.token_latency:
+                await asyncio.sleep(self.token_latency)
+            yield text[start:start + self.chunk_size]
+
+    def create_cache(self, model, system_instruction, ttl):
+        digest = hashlib.sha256(f"{model}:{system_instruction}".encode("utf-8")).hexdigest()[:16]
+        return f"cachedContents/fake-{digest}"
+
+
+def fake_response(model, prompt):
+    count = re.search(r"containing (\d+)", prompt)
+    steps = re.search(r"quiz sets for these learning steps: (\[.*?\])\n", prompt)
+    if steps:
+        sets = [{
+            "step": step,
+            "questions": [{
+                "question": f"Sample question {i + 1} about {step}?",
+                "option1": "First option",
+                "option2": "Second option",
+                "option3": "Third option",
+                "option4": "Fourth option",
+                "answer": f"option{i % 4 + 1}",
+            } for i in range(10)],
+        } for step in json.loads(steps.group(1))]
+        return "```json\n" + json.dumps(sets, indent=2) + "\n```"
+
+    if "multiple-choice questions" in prompt:
+        about = re.search(r"questions about (.+?)(?:\.| at )", prompt)
+        topic = about.group(1) if about else "the topic"
+        questions = [{
+            "question": f"Sample question {i + 1} about {topic}?",
+            "option1": "First option",
+            "option2": "Second option",
+            "option3": "Third option",
+            "option4": "Fourth option",
+            "answer": f"option{i % 4 + 1}",
+        } for i in range(int(count.group(1)) if count else 10)]
+        return "```json\n" + json.dumps(questions, indent=2) + "\n```"
+
+    if "learning path" in prompt:
+        skill = re.search(r'"skill": "(.*?)"', prompt)
+        level = re.search(r'"level": "(.*?)"', prompt)
+        skill = skill.group(1) if skill else "skill"
+        path = {
+            "skill": skill,
+            "level": level.group(1) if level else "Beginner",
+            "topics": [{
+                "name": f"{i + 1}. {skill} topic {i + 1}",
+                "description": f"Key concepts of {skill} part {i + 1}.",
+                "resources": [f"https://example.com/{skill}/{i + 1}"],
+            } for i in range(5)],
+        }
+        return "```json\n" + json.dumps(path, indent=2) + "\n```"
+
+    return f"This is a sample answer to: {prompt[:200]}"
+
+
+def prompt_text(contents):
+    if isinstance(contents, str):
+        return contents
+    parts = []
+    for content in contents:
+        # types.Content or its plain-dict form
+        for part in (content["parts"] if isinstance(content, dict) else content.parts) or []:
+            text = part.get("text") if isinstance(part, dict) else part.text
+            if text:
+                parts.append(text)
+    return "\n".join(parts)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+_buckets = {}
+_slots = {}
+_async_slots = {}
+_state_lock = threading.Lock()
+_metrics = {}
+_speculative = threading.local()
+# prefix digest -> cached content name, or "" while a failed creation is not retried
+_context_caches = LRUCache(maxsize=1024)
+_context_stats = {"hits": 0, "created": 0, "inline": 0, "failed": 0}
+
+
+def set_backend(backend):
+    """Swaps the backend used by every caller, e.g. set_backend(FakeBackend()) for load tests."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if os.environ.get("LLM_BACKEND", "gemini").lower() == "fake":
+                    _backend = FakeBackend(
+                        token_latency=float(os.environ.get("FAKE_LLM_TOKEN_LATENCY", 0)),
+                        first_token_latency=float(os.environ.get("FAKE_LLM_FIRST_TOKEN_LATENCY", 0)),
+                        chunk_size=int(os.environ.get("FAKE_LLM_CHUNK_SIZE", 16)),
+                    )
+                else:
+                    # GEMINI_API_KEY may come from a .env file when the app factory did not run
+                    from dotenv import load_dotenv
+                    load_dotenv()
+                    _backend = GeminiBackend()
+    return _backend
+
+
+def _rate_limit_for(model):
+    for entry in LLM_RATE_LIMITS.split(","):
+        name, _, rpm = entry.partition("=")
+        if name.strip() == model and rpm.strip():
+            return float(rpm)
+    return LLM_RATE_LIMIT
+
+
+@contextmanager
+def speculative():
+    """
+    Marks the model calls this thread makes inside the block as speculative (e.g. prefetch).
+    They draw on LLM_SPECULATIVE_RATE_LIMIT and LLM_SPECULATIVE_CONCURRENCY instead of the
+    user-facing limits, and raise LLMBusyError at once rather than queue.
+    """
+    previous = getattr(_speculative, "active", False)
+    _speculative.active = True
+    try:
+        yield
+    finally:
+        _speculative.active = previous
+
+
+def is_speculative():
+    """True inside a speculative() block on this thread."""
+    return getattr(_speculative, "active", False)
+
+
+def _model_state(model, speculative=False):
+    # Speculative calls are tracked (and reported) under their own key
+    key = f"{model}:speculative" if speculative else model
+    with _state_lock:
+        if key not in _buckets:
+            if speculative:
+                _buckets[key] = TokenBucket(LLM_SPECULATIVE_RATE_LIMIT / 60.0, 1)
+                _slots[key] = threading.BoundedSemaphore(LLM_SPECULATIVE_CONCURRENCY)
+            else:
+                _buckets[key] = TokenBucket(_rate_limit_for(model) / 60.0, LLM_RATE_BURST)
+                _slots[key] = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+            _metrics[key] = {
+                "requests": 0,
+                "errors": 0,
+                "retries": 0,
+                "in_flight": 0,
+                "chunks": 0,
+                "output_chars": 0,
+                "rate_limit_wait_seconds": 0.0,
+                "ttft_seconds_total": 0.0,
+                "duration_seconds_total": 0.0,
+            }
+        return _buckets[key], _slots[key], _metrics[key]
+
+
+def is_retryable(e):
+    """True for model and transport errors that may succeed on another attempt."""
+    # An SDK or httpx error can only come from a backend that has imported them
+    errors = sys.modules.get("google.genai.errors")
+    if errors is not None and isinstance(e, errors.APIError):
+        return e.code in RETRYABLE_STATUS
+    httpx = sys.modules.get("httpx")
+    if httpx is not None and isinstance(e, httpx.TransportError):
+        return True
+    return isinstance(e, (TimeoutError, ConnectionError))
+
+
+def _backoff(attempt):
+    # Full jitter: sleep a random amount up to the exponential ceiling
+    return random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def stream_text(contents, model, config=None):
+    """
+    Yields text chunks for a prompt (a string or a list of types.Content) from the shared backend.
+    Requests are rate limited and concurrency capped per model. Failures before the first chunk
+    are retried with jittered backoff; once text has been yielded the error is raised to the caller.
+    """
+    speculative_call = is_speculative()
+    bucket, slot, stats = _model_state(model, speculative_call)
+    queue_timeout = 0 if speculative_call else LLM_QUEUE_TIMEOUT
+
+    if not slot.acquire(timeout=queue_timeout):
+        raise LLMBusyError(f"Too many concurrent requests for {model}")
+    started = time.monotonic()
+    stats["in_flight"] += 1
+    try:
+        attempt = 0
+        while True:
+            wait_started = time.monotonic()
+            if not bucket.acquire(timeout=queue_timeout):
+                raise LLMBusyError(f"Rate limit exceeded for {model}")
+            stats["rate_limit_wait_seconds"] += time.monotonic() - wait_started
+            stats["requests"] += 1
+
+            received = False
+            try:
+                for text in get_backend().stream(model, contents, config):
+                    if not received:
+                        received = True
+                        stats["ttft_seconds_total"] += time.monotonic() - started
+                    stats["chunks"] += 1
+                    stats["output_chars"] += len(text)
+                    yield text
+                return
+            except Exception as e:
+                if received or attempt >= LLM_MAX_RETRIES or not is_retryable(e):
+                    stats["errors"] += 1
+                    raise
+                stats["retries"] += 1
+                time.sleep(_backoff(attempt))
+                attempt += 1
+    finally:
+        stats["in_flight"] -= 1
+        stats["duration_seconds_total"] += time.monotonic() - started
+        slot.release()
+
+
+async def astream_text(contents, model, config=None):
+    """
+    Async counterpart of stream_text for the event loop: the same per-model rate limit,
+    metrics and retry policy, with its own (larger) async concurrency cap.
+    """
+    bucket, _, stats = _model_state(model)
+    with _state_lock:
+        slot = _async_slots.setdefault(model, asyncio.Semaphore(LLM_ASYNC_MAX_CONCURRENCY))
+
+    try:
+        await asyncio.wait_for(slot.acquire(), timeout=LLM_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise LLMBusyError(f"Too many concurrent requests for {model}")
+    started = time.monotonic()
+    stats["in_flight"] += 1
+    try:
+        attempt = 0
+        while True:
+            wait_started = time.monotonic()
+            if not await bucket.acquire_async(timeout=LLM_QUEUE_TIMEOUT):
+                raise LLMBusyError(f"Rate limit exceeded for {model}")
+            stats["rate_limit_wait_seconds"] += time.monotonic() - wait_started
+            stats["requests"] += 1
+
+            received = False
+            try:
+                async for text in get_backend().astream(model, contents, config):
+                    if not received:
+                        received = True
+                        stats["ttft_seconds_total"] += time.monotonic() - started
+                    stats["chunks"] += 1
+                    stats["output_chars"] += len(text)
+                    yield text
+                return
+            except Exception as e:
+                if received or attempt >= LLM_MAX_RETRIES or not is_retryable(e):
+                    stats["errors"] += 1
+                    raise
+                stats["retries"] += 1
+                await asyncio.sleep(_backoff(attempt))
+                attempt += 1
+    finally:
+        stats["in_flight"] -= 1
+        stats["duration_seconds_total"] += time.monotonic() - started
+        slot.release()
+
+
+def prefix_config(model, system_instruction):
+    """
+    A GenerateContentConfig carrying a stable system prefix, served from a Gemini context
+    cache when the prefix is large enough to be cached, inline otherwise. Cache names are
+    reused until shortly before they expire; a failed creation falls back to inline for a while.
+    None for other backends, which take no config.
+    """
+    if not isinstance(get_backend(), GeminiBackend):
+        return None
+    types = genai_types()
+    if len(system_instruction) < LLM_CONTEXT_CACHE_MIN_CHARS:
+        _context_stats["inline"] += 1
+        return types.GenerateContentConfig(system_instruction=system_instruction)
+
+    key = hashlib.sha256(f"{model}:{system_instruction}".encode("utf-8")).hexdigest()
+    name = _context_caches.get(key)
+    if name is None:
+        try:
+            name = get_backend().create_cache(model, system_instruction, LLM_CONTEXT_CACHE_TTL)
+            _context_caches.set(key, name, ttl=LLM_CONTEXT_CACHE_TTL * 0.9)
+            _context_stats["created"] += 1
+        except Exception:
+            name = ""
+            _context_caches.set(key, name, ttl=min(300, LLM_CONTEXT_CACHE_TTL))
+            _context_stats["failed"] += 1
+    elif name:
+        _context_stats["hits"] += 1
+
+    if not name:
+        _context_stats["inline"] += 1
+        return types.GenerateContentConfig(system_instruction=system_instruction)
+    return types.GenerateContentConfig(cached_content=name)
+
+
+def generate_text(contents, model, config=None):
+    return "".join(stream_text(contents, model, config))
+
+
+def metrics():
+    with _state_lock:
+        return {model: dict(stats) for model, stats in _metrics.items()}
+
+
+def context_cache_stats():
+    return dict(_context_stats)
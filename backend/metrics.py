@@ -0,0 +1,355 @@
+import hmac
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Prometheus-format metrics, served at /metrics.
+#
+# Hot-path cost is a perf_counter() pair and one locked dict update per observation;
+# cache, queue and pool gauges are only computed when /metrics is scraped.
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1").lower() in ("1", "true", "yes")
+# Scrapers outside this host must send "Authorization: Bearer <METRICS_TOKEN>"; without a
+# token /metrics only answers loopback clients
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+COUNT_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144)
+
+_registry = []
+_collectors = []
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+def _format_value(value):
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *labels):
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+                    break
+            entry[-2] += value
+            entry[-1] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labelnames + ("le",)
+        with self._lock:
+            for labels, entry in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, entry):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(names, labels + (bound,))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(names, labels + ('+Inf',))} {entry[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(entry[-2])}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {entry[-1]}")
+        return lines
+
+
+def collector(fn):
+    """
+    Registers fn() as a scrape-time source of metrics. It returns an iterable of
+    (name, help, [(labels dict, value), ...]) gauges, or (name, help, samples, "counter")
+    for cumulative values; counter names get a _total suffix.
+    """
+    _collectors.append(fn)
+    return fn
+
+
+# --- HTTP -------------------------------------------------------------------------------
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Time to produce response headers, by route.",
+    ("method", "endpoint", "status"))
+
+# --- Database -----------------------------------------------------------------------------
+
+db_query_duration = Histogram(
+    "db_query_duration_seconds", "SQL statement execution time, by statement type.", ("operation",), DB_BUCKETS)
+db_query_errors = Counter("db_query_errors_total", "SQL statements that raised, by statement type.", ("operation",))
+
+# --- Generation ---------------------------------------------------------------------------
+
+generation_ttft = Histogram("generation_ttft_seconds", "Time to first model chunk, by generator.", ("kind",))
+generation_duration = Histogram("generation_duration_seconds", "Total generation time, by generator.", ("kind",))
+generation_parse = Histogram(
+    "generation_parse_seconds", "Time spent decoding streamed JSON, by generator.", ("kind",), DB_BUCKETS)
+generation_chunks = Histogram("generation_chunks", "Streamed chunks per generation.", ("kind",), COUNT_BUCKETS)
+generation_output = Histogram(
+    "generation_output_chars", "Characters of model output per generation.", ("kind",), SIZE_BUCKETS)
+generation_items = Counter("generation_items_total", "Valid items (questions, topics) produced.", ("kind",))
+generation_parse_failures = Counter(
+    "generation_parse_failures_total", "Items rejected by validation, plus generations with no valid item.",
+    ("kind",))
+generation_errors = Counter("generation_errors_total", "Generations that raised, by generator.", ("kind",))
+
+
+class GenerationTimer:
+    def __init__(self, kind):
+        self.kind = kind
+        self.started = time.perf_counter()
+        self.first_chunk_at = None
+        self.chunks = 0
+        self.chars = 0
+        self.parse_seconds = 0.0
+        self.items = 0
+        self.rejected = 0
+
+    def chunk(self, text):
+        if self.first_chunk_at is None:
+            self.first_chunk_at = time.perf_counter()
+        self.chunks += 1
+        self.chars += len(text)
+
+    @contextmanager
+    def parsing(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.parse_seconds += time.perf_counter() - started
+
+
+@contextmanager
+def generation(kind):
+    """Times one model generation: wrap the streaming loop and report chunks/items on the timer."""
+    timer = GenerationTimer(kind)
+    try:
+        yield timer
+    except Exception:
+        generation_errors.inc(kind)
+        raise
+    finally:
+        if timer.first_chunk_at is not None:
+            generation_ttft.observe(timer.first_chunk_at - timer.started, kind)
+        generation_duration.observe(time.perf_counter() - timer.started, kind)
+        generation_parse.observe(timer.parse_seconds, kind)
+        generation_chunks.observe(timer.chunks, kind)
+        generation_output.observe(timer.chars, kind)
+        if timer.items:
+            generation_items.inc(kind, amount=timer.items)
+        failures = timer.rejected + (0 if timer.items else 1)
+        if failures:
+            generation_parse_failures.inc(kind, amount=failures)
+
+
+# --- SQL timing via engine events -----------------------------------------------------------
+
+_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "PRAGMA", "CREATE", "ALTER", "WITH"}
+_first_word = re.compile(r"\s*(\w+)")
+
+
+def _operation(statement):
+    match = _first_word.match(statement)
+    word = match.group(1).upper() if match else ""
+    return word if word in _OPERATIONS else "OTHER"
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    if METRICS_ENABLED:
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("metrics_started")
+    if started:
+        db_query_duration.observe(time.perf_counter() - started.pop(), _operation(statement))
+
+
+@event.listens_for(Engine, "handle_error")
+def _on_error(exception_context):
+    conn = exception_context.connection
+    started = conn.info.get("metrics_started") if conn is not None else None
+    if started:
+        started.pop()
+        db_query_errors.inc(_operation(exception_context.statement or ""))
+
+
+# --- Scrape-time gauges and counters --------------------------------------------------------
+
+def _stats_metrics(prefix, help, stats, gauges=()):
+    # A module's stats() dict: sizes and in-flight values are gauges, the rest only ever grow
+    for field, value in stats.items():
+        yield (f"{prefix}_{field}", f"{help} {field.replace('_', ' ')}.", [({}, value)],
+               "gauge" if field in gauges else "counter")
+
+
+@collector
+def _cache_gauges():
+    from backend import answer_cache, http_cache, path_cache, prefetch, step_quiz, topics
+    from backend.shared_store import get_store
+
+    caches = {
+        "http_response": http_cache.stats()["rendered"],
+        "answer": answer_cache.stats(),
+        "topic": topics.stats(),
+        "step_quiz": step_quiz.stats(),
+    }
+    kinds = {"hits": "counter", "misses": "counter", "evictions": "counter", "size": "gauge", "hit_ratio": "gauge"}
+    for field, kind in kinds.items():
+        samples = [({"cache": cache}, stats[field]) for cache, stats in caches.items()]
+        yield f"cache_{field}", f"In-process cache {field.replace('_', ' ')}.", samples, kind
+
+    yield from _stats_metrics("path_cache", "Learning path cache", path_cache.stats(), gauges=("local_size",))
+    yield "http_not_modified", "Conditional GETs answered with 304.", [({}, http_cache.stats()["not_modified"])], "counter"
+    store = get_store().stats()
+    yield "shared_store_keys", "Keys in the shared store.", [({"backend": store["backend"]}, store["size"])]
+    yield from _stats_metrics("path_prefetch", "Speculative path prefetch:", prefetch.stats())
+    step_quizzes = step_quiz.stats()
+    yield from _stats_metrics("step_quiz", "Step quiz generation:",
+                              {field: step_quizzes[field] for field in ("generated", "batches", "fallbacks", "failed")})
+
+
+@collector
+def _llm_gauges():
+    from backend import llm, singleflight
+
+    per_model = llm.metrics()
+    fields = sorted({field for stats in per_model.values() for field in stats})
+    for field in fields:
+        yield (f"llm_{field}", f"Model calls: {field.replace('_', ' ')}.",
+               [({"model": model}, stats.get(field, 0)) for model, stats in sorted(per_model.items())],
+               "gauge" if field == "in_flight" else "counter")
+    yield from _stats_metrics("llm_context_cache", "Context cache", llm.context_cache_stats())
+    yield from _stats_metrics("singleflight", "Single-flight generation", singleflight.stats(), gauges=("in_flight",))
+
+
+@collector
+def _queue_and_pool_gauges():
+    from backend import database
+    from backend.models import db, GenerationJob
+
+    counts = dict(
+        db.session.query(GenerationJob.status, db.func.count(GenerationJob.id))
+        .group_by(GenerationJob.status)
+        .all()
+    )
+    yield ("generation_jobs", "Generation jobs by status.",
+           [({"status": status}, counts.get(status, 0)) for status in ("queued", "running", "succeeded", "failed")])
+    yield from _stats_metrics("db_pool", "Connection pool", database.pool_stats(db.engine),
+                              gauges=("checked_out", "wait_seconds_max", "pool_size", "overflow", "idle"))
+
+
+@collector
+def _auth_gauges():
+    from backend import attempts, passwords
+
+    yield from _stats_metrics("password_hash", "Password hashing", passwords.stats(), gauges=("workers", "queue"))
+    yield ("login_limiter_blocked", "Login attempts refused by the failed-login limiter.",
+           [({"scope": scope}, stats["blocked"]) for scope, stats in attempts.stats().items()], "counter")
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for fn in _collectors:
+        try:
+            for name, help, samples, *kind in fn():
+                kind = kind[0] if kind else "gauge"
+                if kind == "counter" and not name.endswith("_total"):
+                    name += "_total"
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} "
+                                 f"{_format_value(value)}")
+        except Exception as e:
+            # One broken source must not take down the whole scrape
+            lines.append(f"# collector {fn.__name__} failed: {type(e).__name__}")
+    return "\n".join(lines) + "\n"
+
+
+def init_app(app):
+    if not METRICS_ENABLED:
+        return
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop("metrics_started", None)
+        if started is not None:
+            endpoint = request.url_rule.rule if request.url_rule else "<unmatched>"
+            http_request_duration.observe(
+                time.perf_counter() - started, request.method, endpoint, str(response.status_code))
+        return response
+
+    @app.route("/metrics")
+    def metrics_endpoint():
+        if not scrape_allowed():
+            return {"error": "Forbidden"}, 403
+        return Response(render(), mimetype="text/plain; version=0.0.4")
+
+
+def scrape_allowed():
+    """Whether this request may read operational stats: METRICS_TOKEN if set, else loopback only."""
+    if METRICS_TOKEN:
+        return hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {METRICS_TOKEN}")
+    return request.remote_addr in ("127.0.0.1", "::1")
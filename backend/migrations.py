@@ -0,0 +1,224 @@
+import json
+import sys
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, select
+
+from backend.models import (
+    db, LearningPath, LearningStepProgress, Quiz, QuizResult, SchemaMigration, Skill, StepQuiz, Topic,
+)
+from backend.topics import content_hash
+
+# Versioned, in-place schema changes for databases that already exist.
+# db.create_all() builds new databases with the current schema; every migration
+# must therefore be idempotent, since it also runs once against a fresh database.
+#
+# Nothing here runs when the app starts. Deploys run `flask --app backend.app db-upgrade`
+# (or let the gunicorn master do it), so workers boot without touching the schema.
+
+MIGRATIONS = []
+
+
+def migration(version, name):
+    def decorator(fn):
+        MIGRATIONS.append((version, name, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return decorator
+
+
+def _has_column(conn, table, column):
+    return column in {c["name"] for c in db.inspect(conn).get_columns(table)}
+
+
+def _create_index(conn, table, name):
+    # Indexes are declared on the models; migrations only materialise them
+    index = next(i for i in db.metadata.tables[table].indexes if i.name == name)
+    index.create(bind=conn, checkfirst=True)
+
+
+@migration(1, "add quizzes.variant for the quiz bank")
+def _quiz_variant(conn):
+    if not _has_column(conn, "quizzes", "variant"):
+        conn.execute(db.text("ALTER TABLE quizzes ADD COLUMN variant INTEGER NOT NULL DEFAULT 0"))
+
+
+@migration(2, "keyset index for quiz result pages")
+def _quiz_results_keyset_index(conn):
+    _create_index(conn, "quiz_results", "ix_quiz_results_user_taken")
+
+
+@migration(3, "indexes for hot lookup columns")
+def _hot_lookup_indexes(conn):
+    _create_index(conn, "quizzes", "ix_quizzes_skill_variant")
+    _create_index(conn, "quiz_results", "ix_quiz_results_skill_id")
+    _create_index(conn, "learning_paths", "ix_learning_paths_skill_id")
+    _create_index(conn, "learning_step_progress", "ix_learning_step_progress_path_id")
+
+
+def _decode_path_data(value):
+    # Older rows were json.dumps'd into a JSON column, so they decode to a string, possibly twice
+    while isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return {}
+    return value if isinstance(value, dict) else {}
+
+
+@migration(4, "normalize learning path topics into topic rows")
+def _normalize_topics(conn):
+    Topic.__table__.create(bind=conn, checkfirst=True)
+    if not _has_column(conn, "learning_step_progress", "topic_id"):
+        conn.execute(db.text("ALTER TABLE learning_step_progress ADD COLUMN topic_id INTEGER REFERENCES topics(id)"))
+    if not _has_column(conn, "learning_step_progress", "position"):
+        conn.execute(db.text("ALTER TABLE learning_step_progress ADD COLUMN position INTEGER"))
+    _create_index(conn, "learning_step_progress", "ix_learning_step_progress_path_position")
+
+    paths = LearningPath.__table__
+    steps = LearningStepProgress.__table__
+    topics = Topic.__table__
+    for path_id, raw in conn.execute(select(paths.c.id, paths.c.path_data)).all():
+        path_data = _decode_path_data(raw)
+        if "topics" not in path_data:
+            continue  # already normalized
+        path_topics = [t for t in path_data.pop("topics", []) or [] if isinstance(t, dict) and t.get("name")]
+
+        # Match steps to topics by name, in generation order
+        topic_ids = {}
+        for position, topic in enumerate(path_topics):
+            digest = content_hash(topic)
+            topic_id = conn.execute(select(topics.c.id).where(topics.c.content_hash == digest)).scalar()
+            if topic_id is None:
+                topic_id = conn.execute(topics.insert().values(
+                    content_hash=digest, name=topic["name"], data=topic)).inserted_primary_key[0]
+            topic_ids.setdefault(topic["name"], []).append((position, topic_id))
+
+        path_steps = conn.execute(
+            select(steps.c.id, steps.c.step_name)
+            .where(steps.c.path_id == path_id, steps.c.topic_id.is_(None))
+            .order_by(steps.c.id)
+        ).all()
+        for fallback_position, (step_id, step_name) in enumerate(path_steps):
+            matches = topic_ids.get(step_name)
+            position, topic_id = matches.pop(0) if matches else (len(path_topics) + fallback_position, None)
+            conn.execute(steps.update().where(steps.c.id == step_id).values(topic_id=topic_id, position=position))
+
+        conn.execute(paths.update().where(paths.c.id == path_id).values(path_data=path_data))
+
+
+@migration(5, "add users.data_version for HTTP ETags")
+def _user_data_version(conn):
+    if not _has_column(conn, "users", "data_version"):
+        conn.execute(db.text("ALTER TABLE users ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0"))
+
+
+def applied_versions():
+    SchemaMigration.__table__.create(bind=db.engine, checkfirst=True)
+    return {version for (version,) in db.session.query(SchemaMigration.version)}
+
+
+def upgrade():
+    """Applies every pending migration in version order, each in its own transaction."""
+    applied = applied_versions()
+    db.session.commit()
+
+    ran = []
+    for version, name, fn in MIGRATIONS:
+        if version in applied:
+            continue
+        with db.engine.begin() as conn:
+            fn(conn)
+            conn.execute(SchemaMigration.__table__.insert().values(version=version, name=name))
+        ran.append((version, name))
+    return ran
+
+
+def create_schema():
+    """Creates missing tables, then applies pending migrations. Returns the migrations applied."""
+    db.create_all()
+    return upgrade()
+
+
+def hot_queries():
+    """The lookups every request path depends on, with representative parameters."""
+    completed = func.sum(db.case((LearningStepProgress.completed.is_(True), 1), else_=0))
+    return {
+        "quiz results page": select(QuizResult)
+            .where(QuizResult.user_id == 1)
+            .order_by(QuizResult.taken_at.desc(), QuizResult.id.desc())
+            .limit(50),
+        "quiz results count": select(func.count(QuizResult.id)).where(QuizResult.user_id == 1),
+        "quiz bank": select(Quiz).where(Quiz.skill_id == 1).order_by(Quiz.variant, Quiz.id),
+        "quiz bank version": select(Quiz.variant, func.count(Quiz.id), func.max(Quiz.id))
+            .where(Quiz.skill_id == 1)
+            .group_by(Quiz.variant),
+        "skill by name": select(Skill).where(Skill.name == "python"),
+        "learning path by user": select(LearningPath).where(LearningPath.user_id == 1),
+        "learning paths by skill": select(LearningPath).where(LearningPath.skill_id == 1),
+        "steps by path": select(LearningStepProgress).where(LearningStepProgress.path_id == 1),
+        "active path with steps": select(LearningPath.id, Skill.name, LearningStepProgress.id)
+            .join(Skill, Skill.id == LearningPath.skill_id)
+            .outerjoin(LearningStepProgress, LearningStepProgress.path_id == LearningPath.id)
+            .where(LearningPath.user_id == 1)
+            .order_by(LearningStepProgress.position, LearningStepProgress.id),
+        "topics by id": select(Topic.id, Topic.data).where(Topic.id.in_([1, 2, 3])),
+        "step quizzes by key": select(StepQuiz.cache_key, StepQuiz.id, StepQuiz.questions)
+            .where(StepQuiz.cache_key.in_(["a", "b"])),
+        "profile progress": select(Skill.name, func.count(LearningStepProgress.id), completed)
+            .select_from(LearningPath)
+            .join(Skill, Skill.id == LearningPath.skill_id)
+            .outerjoin(LearningStepProgress, LearningStepProgress.path_id == LearningPath.id)
+            .where(LearningPath.user_id == 1)
+            .group_by(LearningPath.id, Skill.name),
+        "top skills": select(Skill.name)
+            .outerjoin(QuizResult, QuizResult.skill_id == Skill.id)
+            .group_by(Skill.id),
+    }
+
+
+def explain_hot_queries():
+    """
+    Runs EXPLAIN QUERY PLAN (SQLite) for each hot query.
+    Returns {name: (uses_index, plan_lines)}; a plan uses an index when no step scans
+    a table without one. Grouping over every skill is a legitimate scan of skills.
+    """
+    results = {}
+    dialect = db.engine.dialect
+    for name, stmt in hot_queries().items():
+        sql = str(stmt.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+        plan = [row[-1] for row in db.session.execute(db.text(f"EXPLAIN QUERY PLAN {sql}"))]
+        full_scans = [
+            line for line in plan
+            if line.startswith("SCAN") and "INDEX" not in line and "skills" not in line
+        ]
+        results[name] = (not full_scans, plan)
+    return results
+
+
+@click.command("db-upgrade")
+@with_appcontext
+def db_upgrade_command():
+    """Creates missing tables and applies pending schema migrations."""
+    ran = create_schema()
+    for version, name in ran:
+        click.echo(f"Applied {version}: {name}")
+    if not ran:
+        click.echo("Database is up to date.")
+
+
+@click.command("check-indexes")
+@with_appcontext
+def check_indexes_command():
+    """Fails if any hot query would scan a table instead of using an index."""
+    if db.engine.dialect.name != "sqlite":
+        click.echo("EXPLAIN QUERY PLAN check only runs on SQLite.")
+        return
+
+    failed = False
+    for name, (uses_index, plan) in explain_hot_queries().items():
+        click.echo(f"{'ok  ' if uses_index else 'SCAN'} {name}: {' | '.join(plan)}")
+        failed = failed or not uses_index
+    if failed:
+        sys.exit(1)
@@ -16,6 +16,8 @@ class User(db.Model, UserMixin):
     # Each user can have ONLY ONE active skill/learning path
     skill_id = db.Column(db.Integer, db.ForeignKey("skills.id"), nullable=True)
     current_level = db.Column(db.String(20), nullable=True)  # beginner / intermediate / advanced
+    # Bumped with every write to the user's path, steps or results; drives HTTP ETags
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
     # Relationships
     skill = db.relationship("Skill", back_populates="users", uselist=False)
@@ -45,15 +47,21 @@ class LearningPath(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), unique=True, nullable=False)  # One path per user
-    skill_id = db.Column(db.Integer, db.ForeignKey("skills.id"), nullable=False)
+    skill_id = db.Column(db.Integer, db.ForeignKey("skills.id"), nullable=False, index=True)
     level = db.Column(db.String(20), nullable=False)
+    # Path fields other than its topics; the topics live in LearningStepProgress/Topic rows
     path_data = db.Column(db.JSON, nullable=False)
     generated_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     # Relationships
     user = db.relationship("User", back_populates="learning_path")
     skill = db.relationship("Skill", back_populates="learning_paths")
-    steps = db.relationship("LearningStepProgress", backref="learning_path", lazy=True)
+    steps = db.relationship(
+        "LearningStepProgress",
+        backref="learning_path",
+        lazy=True,
+        order_by="(LearningStepProgress.position, LearningStepProgress.id)",
+    )
 
     def to_dict(self):
         return {
@@ -68,10 +76,16 @@ class LearningPath(db.Model):
 
 class LearningStepProgress(db.Model):
     __tablename__ = "learning_step_progress"
+    __table_args__ = (
+        # A path's steps in order, read in one range scan
+        db.Index("ix_learning_step_progress_path_position", "path_id", "position"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    path_id = db.Column(db.Integer, db.ForeignKey("learning_paths.id"), nullable=False)
+    path_id = db.Column(db.Integer, db.ForeignKey("learning_paths.id"), nullable=False, index=True)
     step_name = db.Column(db.String(200), nullable=False)
+    topic_id = db.Column(db.Integer, db.ForeignKey("topics.id"), nullable=True)
+    position = db.Column(db.Integer, nullable=True)
     completed = db.Column(db.Boolean, default=False)
     completed_at = db.Column(db.DateTime, nullable=True)
 
@@ -79,17 +93,34 @@ class LearningStepProgress(db.Model):
         return {
             "id": self.id,
             "step_name": self.step_name,
+            "topic_id": self.topic_id,
+            "position": self.position,
             "completed": self.completed,
             "completed_at": self.completed_at.isoformat() if self.completed_at else None
         }
 
 
+class Topic(db.Model):
+    __tablename__ = "topics"
+
+    id = db.Column(db.Integer, primary_key=True)
+    # sha256 of the canonical topic JSON; identical topics share one row across users
+    content_hash = db.Column(db.String(64), unique=True, nullable=False)
+    name = db.Column(db.String(200), nullable=False)
+    data = db.Column(db.JSON, nullable=False)  # name, description, resources
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
 class QuizResult(db.Model):
     __tablename__ = "quiz_results"
+    __table_args__ = (
+        # Keyset pagination of a user's results by (taken_at, id)
+        db.Index("ix_quiz_results_user_taken", "user_id", "taken_at", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
-    skill_id = db.Column(db.Integer, db.ForeignKey("skills.id"), nullable=False)
+    skill_id = db.Column(db.Integer, db.ForeignKey("skills.id"), nullable=False, index=True)
     level = db.Column(db.String(20), nullable=False)
     score = db.Column(db.Integer, nullable=False)
     passed = db.Column(db.Boolean, nullable=False)
@@ -102,6 +133,10 @@ class QuizResult(db.Model):
 
 class Quiz(db.Model):
     __tablename__ = "quizzes"
+    __table_args__ = (
+        # Quiz bank lookups: one skill's questions grouped by variant
+        db.Index("ix_quizzes_skill_variant", "skill_id", "variant"),
+    )
     id = db.Column(db.Integer, primary_key=True)
     question = db.Column(db.String(500), nullable=False)
     option1 = db.Column(db.String(255))
@@ -110,6 +145,8 @@ class Quiz(db.Model):
     option4 = db.Column(db.String(255))
     answer = db.Column(db.String(255))
     created_at = db.Column(db.DateTime, default=db.func.now())
+    # Quiz bank variant; each variant is one complete set of questions for the skill
+    variant = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
     # Foreign key only
     skill_id = db.Column(db.Integer, db.ForeignKey("skills.id"), nullable=False)
@@ -129,3 +166,108 @@ class Quiz(db.Model):
             "skill": self.skill.name if self.skill else None,
         }
 
+
+class CachedLearningPath(db.Model):
+    __tablename__ = "learning_path_cache"
+
+    id = db.Column(db.Integer, primary_key=True)
+    # sha256 of (prompt version, normalized skill, level)
+    cache_key = db.Column(db.String(64), unique=True, nullable=False)
+    skill = db.Column(db.String(100), nullable=False)
+    level = db.Column(db.String(20), nullable=False)
+    prompt_version = db.Column(db.String(20), nullable=False)
+    path_data = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    refreshed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class StepQuiz(db.Model):
+    __tablename__ = "step_quizzes"
+
+    id = db.Column(db.Integer, primary_key=True)
+    # sha256 of (prompt version, normalized step name); users whose paths share a step share its quiz
+    cache_key = db.Column(db.String(64), unique=True, nullable=False)
+    step_name = db.Column(db.String(200), nullable=False)
+    prompt_version = db.Column(db.String(20), nullable=False)
+    questions = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class GenerationJob(db.Model):
+    __tablename__ = "generation_jobs"
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    kind = db.Column(db.String(50), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True)
+    payload = db.Column(db.JSON, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default="queued")  # queued / running / succeeded / failed
+    result = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "attempts": self.attempts,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class GenerationClaim(db.Model):
+    __tablename__ = "generation_claims"
+
+    # One row per in-flight generation; the primary key makes the claim exclusive
+    key = db.Column(db.String(200), primary_key=True)
+    owner = db.Column(db.String(100), nullable=False)
+    claimed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+
+class ChatSession(db.Model):
+    __tablename__ = "chat_sessions"
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)
+    # Compacted digest of turns that no longer fit the history budget
+    summary = db.Column(db.Text, nullable=False, default="")
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    turns = db.relationship(
+        "ChatTurn", backref="session", lazy=True, order_by="ChatTurn.id", cascade="all, delete-orphan"
+    )
+
+
+class ChatTurn(db.Model):
+    __tablename__ = "chat_turns"
+
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.String(32), db.ForeignKey("chat_sessions.id"), nullable=False, index=True)
+    role = db.Column(db.String(10), nullable=False)  # user / model
+    text = db.Column(db.Text, nullable=False)
+    tokens = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "role": self.role,
+            "text": self.text,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
+
+
+class SchemaMigration(db.Model):
+    __tablename__ = "schema_migrations"
+
+    version = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,95 @@
+import base64
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# Identical results recorded this close together are one submission sent twice
+DUPLICATE_WINDOW = timedelta(seconds=10)
+
+
+class CursorError(ValueError):
+    pass
+
+
+def encode_cursor(time_value, row_id, signature):
+    payload = {"t": time_value.isoformat(), "i": row_id, "s": list(signature)}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(payload["t"]), int(payload["i"]), tuple(payload["s"])
+    except (ValueError, KeyError, TypeError):
+        raise CursorError("Invalid cursor")
+
+
+def page_size(value):
+    if value in (None, ""):
+        return DEFAULT_PAGE_SIZE
+    try:
+        size = int(value)
+    except ValueError:
+        raise CursorError("limit must be an integer")
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def keyset_page(query, time_col, id_col, signature, limit, cursor=None, descending=True):
+    """
+    Returns (rows, next_cursor) for one page of query ordered by (time_col, id_col).
+
+    Consecutive rows with the same signature(row) recorded within DUPLICATE_WINDOW of each
+    other collapse into the first one; the cursor carries the last row's signature so a
+    duplicate run split across a page boundary is still collapsed.
+    """
+    last = None
+    if cursor:
+        last = decode_cursor(cursor)
+
+    if descending:
+        order = (time_col.desc(), id_col.desc())
+    else:
+        order = (time_col.asc(), id_col.asc())
+
+    # The key of each row is read through the columns' attribute names, so any model pages alike
+    def time_of(row):
+        return getattr(row, time_col.key)
+
+    def id_of(row):
+        return getattr(row, id_col.key)
+
+    rows = []
+    batch_size = limit + 1
+    while True:
+        batch_query = query
+        if last is not None:
+            after_time, after_id, _ = last
+            if descending:
+                batch_query = batch_query.filter(or_(
+                    time_col < after_time, and_(time_col == after_time, id_col < after_id)))
+            else:
+                batch_query = batch_query.filter(or_(
+                    time_col > after_time, and_(time_col == after_time, id_col > after_id)))
+        batch = batch_query.order_by(*order).limit(batch_size).all()
+
+        for row in batch:
+            sig = tuple(signature(row))
+            duplicate = (
+                last is not None
+                and last[2] == sig
+                and abs(time_of(row) - last[0]) <= DUPLICATE_WINDOW
+            )
+            if not duplicate:
+                if len(rows) == limit:
+                    # A further distinct row exists, so there is a next page
+                    prev = rows[-1]
+                    return rows, encode_cursor(time_of(prev), id_of(prev), signature(prev))
+                rows.append(row)
+            last = (time_of(row), id_of(row), sig)
+
+        if len(batch) < batch_size:
+            return rows, None
@@ -0,0 +1,123 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Password hashing off the request threads.
+#
+# The KDF runs in a small process pool so a burst of logins cannot starve the threads
+# serving everything else. The pool has a bounded queue: when PASSWORD_HASH_QUEUE hashes
+# are already pending, callers wait up to PASSWORD_HASH_QUEUE_TIMEOUT and then get
+# HashingBusy (the routes answer 503). PASSWORD_HASH_WORKERS=0 hashes inline.
+# Logins from clients with recent failures are "suspect": at most PASSWORD_HASH_SUSPECT_SLOTS
+# of them are queued at once and they never wait, so brute-force traffic that gets past
+# the attempt limiter cannot crowd out everyone else's logins.
+#
+# PASSWORD_HASH_METHOD is any werkzeug method string, e.g. "scrypt:32768:8:1" or
+# "pbkdf2:sha256:600000". Hashes made with another method or cost are upgraded on the
+# next successful login.
+
+PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+PASSWORD_HASH_QUEUE = int(os.environ.get("PASSWORD_HASH_QUEUE", PASSWORD_HASH_WORKERS * 4))
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.environ.get("PASSWORD_HASH_QUEUE_TIMEOUT", 2.0))
+PASSWORD_HASH_SUSPECT_SLOTS = int(os.environ.get("PASSWORD_HASH_SUSPECT_SLOTS", max(1, PASSWORD_HASH_WORKERS // 2)))
+
+
+class HashingBusy(RuntimeError):
+    pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(max(1, PASSWORD_HASH_QUEUE))
+_suspect_slots = threading.BoundedSemaphore(max(1, PASSWORD_HASH_SUSPECT_SLOTS))
+_stats = {"hashed": 0, "verified": 0, "rehashed": 0, "rejected_busy": 0}
+
+
+def method_of(password_hash):
+    return password_hash.split("$", 1)[0]
+
+
+def _hash(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def _verify(password_hash, password, method):
+    # Runs in a worker: verification and the optional upgrade cost one round trip
+    if not check_password_hash(password_hash, password):
+        return False, None
+    if method_of(password_hash) != _canonical_method(method):
+        return True, generate_password_hash(password, method=method)
+    return True, None
+
+
+_canonical = {}
+
+
+def _canonical_method(method):
+    # "scrypt" is stored as "scrypt:32768:8:1"; compare against the spelled-out form
+    if method not in _canonical:
+        _canonical[method] = method_of(generate_password_hash("", method=method))
+    return _canonical[method]
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn: forking a process that already runs threads is not safe
+                _pool = ProcessPoolExecutor(
+                    max_workers=PASSWORD_HASH_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _pool
+
+
+def _run(fn, *args, suspect=False):
+    if PASSWORD_HASH_WORKERS <= 0:
+        return fn(*args)
+
+    if suspect and not _suspect_slots.acquire(blocking=False):
+        _stats["rejected_busy"] += 1
+        raise HashingBusy("Password hashing is at capacity")
+    try:
+        if not _slots.acquire(timeout=0 if suspect else PASSWORD_HASH_QUEUE_TIMEOUT):
+            _stats["rejected_busy"] += 1
+            raise HashingBusy("Password hashing is at capacity")
+        try:
+            return _get_pool().submit(fn, *args).result()
+        finally:
+            _slots.release()
+    finally:
+        if suspect:
+            _suspect_slots.release()
+
+
+def hash_password(password):
+    _stats["hashed"] += 1
+    return _run(_hash, password, PASSWORD_HASH_METHOD)
+
+
+def verify_password(password_hash, password, suspect=False):
+    """Returns (matches, upgraded_hash); upgraded_hash is set when the stored hash should be replaced."""
+    _stats["verified"] += 1
+    ok, upgraded = _run(_verify, password_hash, password, PASSWORD_HASH_METHOD, suspect=suspect)
+    if upgraded:
+        _stats["rehashed"] += 1
+    return ok, upgraded
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def stats():
+    return {**_stats, "workers": PASSWORD_HASH_WORKERS, "queue": PASSWORD_HASH_QUEUE}
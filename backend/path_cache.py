@@ -0,0 +1,193 @@
+import hashlib
+import os
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from backend import json_provider, singleflight
+from backend.cache import LRUCache
+from backend.generator import PATH_PROMPT_VERSION, generate_learning_path
+from backend.models import db, CachedLearningPath
+
+# Paths older than this are refreshed in the background but still served
+PATH_CACHE_TTL = int(os.environ.get("PATH_CACHE_TTL", 7 * 24 * 3600))
+# Paths older than this are never served; the caller waits for a new one
+PATH_CACHE_MAX_STALE = int(os.environ.get("PATH_CACHE_MAX_STALE", 30 * 24 * 3600))
+# The in-process tier is short lived so refreshed rows reach every worker
+PATH_CACHE_LOCAL_TTL = int(os.environ.get("PATH_CACHE_LOCAL_TTL", 600))
+PATH_CACHE_LOCAL_SIZE = int(os.environ.get("PATH_CACHE_LOCAL_SIZE", 512))
+
+_local = LRUCache(maxsize=PATH_CACHE_LOCAL_SIZE, ttl=PATH_CACHE_LOCAL_TTL)
+# cache key -> (path dict, its JSON fragment), filled and expired together with _local
+_encoded = LRUCache(maxsize=PATH_CACHE_LOCAL_SIZE, ttl=PATH_CACHE_LOCAL_TTL)
+_refreshing = set()
+_refresh_lock = threading.Lock()
+_stats = {"db_hits": 0, "misses": 0, "stale_served": 0, "refreshes": 0, "uncacheable": 0}
+
+
+def normalize_skill(skill):
+    return skill.strip().lower().replace(" ", "")
+
+
+def cache_key(skill, level, prompt_version=PATH_PROMPT_VERSION):
+    raw = f"{prompt_version}:{normalize_skill(skill)}:{level}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _is_cacheable(path_data):
+    return isinstance(path_data, dict) and bool(path_data.get("topics"))
+
+
+def flight_key(skill, level):
+    """Single-flight key shared by every code path that generates this cache entry."""
+    return f"path:{cache_key(skill, level)}"
+
+
+def peek(skill, level):
+    """Returns the cached path for (skill, level) without generating it; None on a miss."""
+    key = cache_key(skill, level)
+
+    path_data = _local.get(key)
+    if path_data is not None:
+        return path_data
+
+    row = CachedLearningPath.query.filter_by(cache_key=key).first()
+    if row is not None:
+        age = datetime.utcnow() - (row.refreshed_at or row.created_at)
+        if age <= timedelta(seconds=PATH_CACHE_TTL):
+            _stats["db_hits"] += 1
+            _remember(key, row.path_data)
+            return row.path_data
+        if age <= timedelta(seconds=PATH_CACHE_MAX_STALE):
+            _stats["stale_served"] += 1
+            _refresh_in_background(skill, level)
+            return row.path_data
+
+    return None
+
+
+def get_learning_path(skill, level):
+    """
+    Returns the learning path for (skill, level), generating it only when neither
+    the in-process tier nor the shared database tier has a usable copy.
+    The returned dict is shared between callers and must be treated as read-only.
+    """
+    path_data = peek(skill, level)
+    if path_data is not None:
+        return path_data
+
+    _stats["misses"] += 1
+    return _generate_once(skill, level)
+
+
+def _load_fresh(key):
+    row = CachedLearningPath.query.filter_by(cache_key=key).first()
+    if row is None:
+        return None
+    age = datetime.utcnow() - (row.refreshed_at or row.created_at)
+    return row.path_data if age <= timedelta(seconds=PATH_CACHE_TTL) else None
+
+
+def _generate_once(skill, level):
+    # Concurrent misses for the same key share one generation, across processes too
+    key = cache_key(skill, level)
+    return singleflight.do(
+        flight_key(skill, level),
+        lambda: _generate_and_store(skill, level),
+        lookup=lambda: _load_fresh(key),
+    )
+
+
+def _generate_and_store(skill, level):
+    path_data = generate_learning_path(normalize_skill(skill), level)
+    return store(skill, level, path_data)
+
+
+def store(skill, level, path_data):
+    """Saves a freshly generated path in both tiers; malformed output is returned but never cached."""
+    if not _is_cacheable(path_data):
+        # Never cache malformed model output; the next caller retries
+        _stats["uncacheable"] += 1
+        return path_data
+
+    key = cache_key(skill, level)
+    now = datetime.utcnow()
+    row = CachedLearningPath.query.filter_by(cache_key=key).first()
+    if row is None:
+        row = CachedLearningPath(
+            cache_key=key,
+            skill=normalize_skill(skill),
+            level=level,
+            prompt_version=PATH_PROMPT_VERSION,
+            created_at=now,
+        )
+        db.session.add(row)
+    row.path_data = path_data
+    row.refreshed_at = now
+
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another worker stored the same key first; its copy is just as good
+        db.session.rollback()
+
+    _remember(key, path_data)
+    return path_data
+
+
+def _remember(key, path_data):
+    _local.set(key, path_data)
+    _encoded.set(key, (path_data, json_provider.fragment(path_data)))
+
+
+def encoded(skill, level, path_data):
+    """
+    The pre-encoded JSON of path_data when it is the copy cached for (skill, level),
+    so responses can splice it in; path_data itself otherwise.
+    """
+    entry = _encoded.get(cache_key(skill, level))
+    if entry is not None and entry[0] is path_data:
+        return entry[1]
+    return path_data
+
+
+def _refresh_in_background(skill, level):
+    key = cache_key(skill, level)
+    with _refresh_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    app = current_app._get_current_object()
+
+    def run():
+        try:
+            with app.app_context():
+                _stats["refreshes"] += 1
+                _generate_once(skill, level)
+        except Exception as e:
+            print(f"Learning path refresh failed for {skill}/{level}: {e}")
+        finally:
+            with _refresh_lock:
+                _refreshing.discard(key)
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def invalidate(skill, level):
+    key = cache_key(skill, level)
+    _local.delete(key)
+    _encoded.delete(key)
+    CachedLearningPath.query.filter_by(cache_key=key).delete()
+    db.session.commit()
+
+
+def stats():
+    local = _local.stats()
+    return {
+        "local_hits": local["hits"],
+        "local_size": local["size"],
+        **_stats,
+    }
@@ -0,0 +1,192 @@
+from datetime import datetime
+
+from sqlalchemy import insert, select, update
+
+from backend import http_cache, topics as topic_store
+from backend.generator import stream_quiz
+from backend.json_stream import QUESTION_FIELDS, valid_question, valid_topic
+from backend.models import db, LearningPath, LearningStepProgress, Quiz, QuizResult, Skill, User
+
+
+def _bump_data_version(user_id):
+    # Part of the caller's transaction: the new ETag becomes visible with the change itself
+    db.session.execute(
+        update(User).where(User.id == user_id).values(data_version=User.data_version + 1)
+    )
+
+
+def get_or_create_skill(normalized_skill, description):
+    skill_obj = Skill.query.filter_by(name=normalized_skill).first()
+    if not skill_obj:
+        skill_obj = Skill(name=normalized_skill, description=description)
+        db.session.add(skill_obj)
+        db.session.commit()
+    return skill_obj
+
+
+def generate_and_save_quiz(skill_id, normalized_skill, variant=0):
+    """Generates one 10-question set for the skill and stores it as the given variant."""
+    content = []
+    for item in stream_quiz(normalized_skill, variant):
+        content.append(item)
+        if len(content) == 10:
+            break
+
+    if not content:
+        # Nothing usable came back; store nothing so the next request retries
+        raise ValueError(f"Model returned no valid quiz questions for {normalized_skill}")
+
+    save_quiz_set(skill_id, content, variant)
+    return content
+
+
+def save_quiz_set(skill_id, questions, variant=0):
+    """
+    Inserts a generated question set with one bulk INSERT and one commit.
+    Raises ValueError, writing nothing, when the set contains no valid question.
+    """
+    rows = [
+        {"skill_id": skill_id, "variant": variant, **{field: q[field] for field in QUESTION_FIELDS}}
+        for q in questions if valid_question(q)
+    ]
+    if not rows:
+        raise ValueError("Model returned no valid quiz questions")
+
+    try:
+        db.session.execute(insert(Quiz), rows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(rows)
+
+
+def save_submission(user_id, skill_id, level, score, path_data):
+    """
+    Writes the quiz result, the learning path and all of its steps in a single transaction.
+    Malformed path data raises ValueError before anything is written, and any database error
+    rolls the whole submission back, so a path is never left half-written.
+    """
+    topics = path_data.get("topics") if isinstance(path_data, dict) else None
+    if not topics or not all(isinstance(t, dict) and valid_topic(t) for t in topics):
+        raise ValueError("Generated learning path is malformed")
+
+    try:
+        topic_ids = topic_store.ensure_topics(topics)
+        db.session.add(QuizResult(
+            user_id=user_id,
+            skill_id=skill_id,
+            score=score,
+            passed=score >= 6,
+            level=level,
+        ))
+        learning_path = LearningPath(
+            user_id=user_id,
+            skill_id=skill_id,
+            level=level,
+            # Stored natively; the topics themselves are normalized into Topic rows
+            path_data={key: value for key, value in path_data.items() if key != "topics"},
+        )
+        db.session.add(learning_path)
+        # Flush for the path id only; nothing is committed until every step is in
+        db.session.flush()
+
+        db.session.execute(insert(LearningStepProgress), [
+            {
+                "path_id": learning_path.id,
+                "step_name": topic["name"],
+                "topic_id": topic_id,
+                "position": position,
+                "completed": False,
+            }
+            for position, (topic, topic_id) in enumerate(zip(topics, topic_ids))
+        ])
+        _bump_data_version(user_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    http_cache.invalidate_user(user_id)
+    return learning_path
+
+
+def mark_step_completed(step):
+    """Marks a step completed and bumps its owner's data version in one commit."""
+    user_id = step.learning_path.user_id
+    try:
+        step.completed = True
+        step.completed_at = step.completed_at or datetime.utcnow()
+        _bump_data_version(user_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    http_cache.invalidate_user(user_id)
+
+
+def load_learning_path(user_id):
+    """
+    Returns a user's active path as served by /get-skill, or None.
+    The path, its skill and its ordered steps come from one indexed query; topic
+    contents come from the shared topic store, so nothing is JSON-decoded per request.
+    """
+    rows = db.session.execute(
+        select(
+            LearningPath.id,
+            LearningPath.level,
+            Skill.name,
+            LearningStepProgress.id,
+            LearningStepProgress.step_name,
+            LearningStepProgress.topic_id,
+            LearningStepProgress.position,
+            LearningStepProgress.completed,
+            LearningStepProgress.completed_at,
+        )
+        .join(Skill, Skill.id == LearningPath.skill_id)
+        .outerjoin(LearningStepProgress, LearningStepProgress.path_id == LearningPath.id)
+        .where(LearningPath.user_id == user_id)
+        .order_by(LearningStepProgress.position, LearningStepProgress.id)
+    ).all()
+    if not rows:
+        return None
+
+    path_id, level, skill_name = rows[0][:3]
+    steps = [
+        {
+            "id": step_id,
+            "step_name": step_name,
+            "topic_id": topic_id,
+            "position": position,
+            "completed": completed,
+            "completed_at": completed_at.isoformat() if completed_at else None,
+        }
+        for _, _, _, step_id, step_name, topic_id, position, completed, completed_at in rows
+        if step_id is not None
+    ]
+    topics = topic_store.get_topics([step["topic_id"] for step in steps if step["topic_id"] is not None])
+    return {
+        "id": path_id,
+        "skill": skill_name,
+        "level": level,
+        "learning_path": {
+            "skill": skill_name,
+            "level": level,
+            # Steps the backfill could not match to a topic keep at least their name
+            "topics": [topics.get(step["topic_id"], {"name": step["step_name"]}) for step in steps],
+        },
+        "steps": steps,
+    }
+
+
+def delete_learning_path(learning_path):
+    """Removes a path and all its steps with one bulk DELETE and one commit."""
+    user_id = learning_path.user_id
+    try:
+        LearningStepProgress.query.filter_by(path_id=learning_path.id).delete(synchronize_session=False)
+        db.session.delete(learning_path)
+        _bump_data_version(user_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    http_cache.invalidate_user(user_id)
@@ -0,0 +1,98 @@
+import os
+
+from backend import llm, path_cache
+from backend.attempts import AttemptLimiter
+from backend.jobs import enqueue, job_handler
+from backend.models import LearningPath
+from backend.shared_store import get_store
+
+# Speculative learning path generation.
+#
+# Serving a quiz tells us which skill the learner will submit, but not the level, so
+# the paths for every level are queued as soon as the quiz is served. By the time the
+# answers come in, /submit usually finds its path in path_cache, or joins the generation
+# still in flight through single-flight, instead of starting one after the last answer.
+#
+# Every level costs a model call whether or not it is used, so this is opt-in and bounded:
+# a skill is looked at once per PATH_PREFETCH_COOLDOWN, a user triggers at most
+# PATH_PREFETCH_USER_QUOTA skills a day, and at most PATH_PREFETCH_BUDGET speculative
+# generations start per hour across all users. Prefetch jobs are never retried.
+#
+# Prefetch jobs run on the job queue's background pool, so they never delay a job a user
+# is waiting on, and their model calls are speculative: they spend a separate, smaller
+# rate budget (LLM_SPECULATIVE_*) and are dropped when it is used up, leaving the
+# user-facing budget to real submits.
+
+PATH_PREFETCH_ENABLED = os.environ.get("PATH_PREFETCH", "0").lower() in ("1", "true", "yes")
+PATH_PREFETCH_LEVELS = [
+    level.strip() for level in os.environ.get("PATH_PREFETCH_LEVELS", "Beginner,Intermediate,Advanced").split(",")
+    if level.strip()
+]
+PATH_PREFETCH_COOLDOWN = int(os.environ.get("PATH_PREFETCH_COOLDOWN", 600))
+PATH_PREFETCH_USER_QUOTA = int(os.environ.get("PATH_PREFETCH_USER_QUOTA", 10))
+PATH_PREFETCH_BUDGET = int(os.environ.get("PATH_PREFETCH_BUDGET", 120))
+
+_user_quota = AttemptLimiter("prefetch-user", PATH_PREFETCH_USER_QUOTA, 24 * 3600)
+_budget = AttemptLimiter("prefetch-budget", PATH_PREFETCH_BUDGET, 3600)
+_stats = {
+    "queued": 0,
+    "already_cached": 0,
+    "skipped_cooldown": 0,
+    "skipped_active_path": 0,
+    "skipped_quota": 0,
+    "skipped_budget": 0,
+}
+
+
+@job_handler("prefetch_learning_path", model="prefetch", background=True)
+def _prefetch_job(payload):
+    with llm.speculative():
+        path_data = path_cache.get_learning_path(payload["skill"], payload["level"])
+    # Malformed output is not cached; the real submit will generate again
+    cached = isinstance(path_data, dict)
+    return {"skill": payload["skill"], "level": payload["level"], "cached": cached}
+
+
+def prefetch_paths(skill_name, user_id):
+    """Queues generation of the skill's uncached learning paths. Returns the levels queued."""
+    if not PATH_PREFETCH_ENABLED:
+        return []
+
+    skill = path_cache.normalize_skill(skill_name)
+    store = get_store()
+    recent = f"prefetch:{skill}"
+    if store.get(recent) is not None:
+        _stats["skipped_cooldown"] += 1
+        return []
+    if _user_quota.retry_after(user_id):
+        _stats["skipped_quota"] += 1
+        return []
+    if LearningPath.query.filter_by(user_id=user_id).first():
+        # Their submit would be refused until the current path is completed
+        _stats["skipped_active_path"] += 1
+        return []
+    if not store.add(recent, 1, ttl=PATH_PREFETCH_COOLDOWN):
+        # Another request (or worker) got here first
+        _stats["skipped_cooldown"] += 1
+        return []
+
+    queued = []
+    for level in PATH_PREFETCH_LEVELS:
+        if path_cache.peek(skill, level) is not None:
+            _stats["already_cached"] += 1
+            continue
+        if _budget.retry_after("all"):
+            _stats["skipped_budget"] += 1
+            break
+        _budget.record("all")
+        enqueue("prefetch_learning_path", {"skill": skill, "level": level}, max_attempts=1)
+        queued.append(level)
+
+    _stats["queued"] += len(queued)
+    if queued:
+        _user_quota.record(user_id)
+    return queued
+
+
+def stats():
+    return dict(_stats)
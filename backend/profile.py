@@ -1,6 +1,8 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint
 from flask_login import login_required, current_user
-from backend.models import User, LearningPath,  QuizResult
+from sqlalchemy import func
+from backend import http_cache
+from backend.models import db, LearningPath, LearningStepProgress, QuizResult, Skill
 
 profile_bp = Blueprint("profile", __name__, url_prefix="/profile")
 
@@ -9,28 +11,46 @@ profile_bp = Blueprint("profile", __name__, url_prefix="/profile")
 def get_profile():
     user = current_user
 
-    # Fetch learning paths
-    learning_paths = LearningPath.query.filter_by(user_id=user.id).all()
+    # Repeat polls are answered from the ETag or the rendered body without touching the tables
+    key = ("profile", user.id)
+    tag = http_cache.etag(*key, user.data_version)
+    response = http_cache.cached_response(key, tag, "profile")
+    if response is not None:
+        return response
+
+    # Step totals and completed counts per learning path, aggregated in SQL
+    completed = func.sum(db.case((LearningStepProgress.completed.is_(True), 1), else_=0))
+    learning_paths = (
+        db.session.query(
+            Skill.name,
+            func.count(LearningStepProgress.id),
+            func.coalesce(completed, 0),
+        )
+        .select_from(LearningPath)
+        .join(Skill, Skill.id == LearningPath.skill_id)
+        .outerjoin(LearningStepProgress, LearningStepProgress.path_id == LearningPath.id)
+        .filter(LearningPath.user_id == user.id)
+        .group_by(LearningPath.id, Skill.name)
+        .order_by(LearningPath.id)
+        .all()
+    )
 
     currently_learning = []
     progress_data = []
 
-    for lp in learning_paths:
-        steps = lp.steps
-        total_steps = len(steps)
-        completed_steps = sum(1 for step in steps if step.completed)
+    for skill_name, total_steps, completed_steps in learning_paths:
         progress = (completed_steps / total_steps) * 100 if total_steps > 0 else 0
 
-        currently_learning.append(lp.skill.name)
+        currently_learning.append(skill_name)
         progress_data.append({
-            "skill": lp.skill.name,
+            "skill": skill_name,
             "progress": round(progress, 2)
         })
 
     # Count quizzes taken
-    quiz_count = QuizResult.query.filter_by(user_id=user.id).count()
+    quiz_count = db.session.query(func.count(QuizResult.id)).filter(QuizResult.user_id == user.id).scalar()
 
-    return jsonify({
+    return http_cache.render(key, tag, {
         "id": user.id,
         "name": user.name,
         "email": user.email,
@@ -38,5 +58,4 @@ def get_profile():
         "currently_learning": currently_learning,
         "progress": progress_data,
         "quizzes_taken": quiz_count
-    })
-
+    }, "profile")
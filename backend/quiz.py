@@ -1,80 +1,134 @@
-from flask import Blueprint, request, jsonify
+import json
+import os
+from datetime import datetime
+
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from flask_login import login_required, current_user
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 from backend.models import db, QuizResult, LearningPath, Skill, Quiz, LearningStepProgress
-from backend.generator import *
+from backend.generator import stream_learning_path, stream_quiz
+from backend import http_cache, json_provider, llm, prefetch, singleflight, step_quiz
+from backend.jobs import job_handler, enqueue, accepted_response
+from backend.pagination import keyset_page, page_size
+from backend.shared_store import get_store
+from backend.persistence import (
+    delete_learning_path, generate_and_save_quiz, get_or_create_skill, load_learning_path,
+    mark_step_completed, save_quiz_set, save_submission,
+)
 
 quiz_bp = Blueprint('services', __name__, url_prefix='/api')
 
-@quiz_bp.route('/generate-quiz/<skill_name>', methods=['GET'])
-@login_required
-def generate_quiz_route(skill_name):
-    import re, json
+# Seconds a client is told to wait when the model's rate or concurrency limit refuses a request
+LLM_BUSY_RETRY_AFTER = int(os.environ.get("LLM_BUSY_RETRY_AFTER", 5))
 
-    # Normalize skill name
-    normalized_skill = skill_name.strip().lower().replace(" ", "")
 
-    # Check if the skill exists in DB; if not, create it
-    skill_obj = Skill.query.filter_by(name=normalized_skill).first()
-    if not skill_obj:
-        skill_obj = Skill(name=normalized_skill, description=f"Auto-generated skill for {normalized_skill}")
-        db.session.add(skill_obj)
-        db.session.commit()
-
-    # Check if quizzes for this skill already exist
-    existing_quizzes = Quiz.query.filter_by(skill_id=skill_obj.id).all()
-    if existing_quizzes:
-        return jsonify([q.to_dict() for q in existing_quizzes])
+@quiz_bp.errorhandler(llm.LLMBusyError)
+def _model_busy(e):
+    return jsonify({"error": "Generation is busy, try again shortly"}), 503, {"Retry-After": str(LLM_BUSY_RETRY_AFTER)}
 
-    # Generate new quizzes using the original skill_name
-    raw_content = generate_quiz(normalized_skill)
-    cleaned = re.sub(r"^```json\s*|\s*```$", "", raw_content.strip())
 
-    try:
-        content = json.loads(cleaned)
-        if isinstance(content, dict) and "quiz" in content:
-            content = content["quiz"]
-    except Exception:
-        content = [{
-            "question": cleaned,
-            "option1": "", "option2": "", "option3": "", "option4": "", "answer": ""
-        }]
-
-    # Save new quizzes
-    for item in content[:10]:
-        quiz = Quiz(
-            skill_id=skill_obj.id,
-            question=item.get("question"),
-            option1=item.get("option1"),
-            option2=item.get("option2"),
-            option3=item.get("option3"),
-            option4=item.get("option4"),
-            answer=item.get("answer"),
-        )
-        db.session.add(quiz)
-    db.session.commit()
+@quiz_bp.errorhandler(TimeoutError)
+def _generation_timeout(e):
+    # Raised by singleflight when the caller generating the same content took too long
+    return jsonify({"error": "Generation timed out, try again shortly"}), 504
 
-    return jsonify(content[:10])
 
+def _wants_async():
+    # ?async=1 hands generation to the job queue and returns a job id right away
+    return request.args.get("async", "").lower() in ("1", "true", "yes")
 
-@quiz_bp.route("/submit", methods=["POST"])
-@login_required
-def submit_quiz():
-    import json
-    from backend.generator import generate_learning_path
 
-    data = request.get_json()
-    score = data.get("score")
-    skill_name = data.get("skill")
+def _load_quiz(skill_id):
+    """Serves one variant from the skill's quiz bank, rotating to the next variant on each call."""
+    rows = Quiz.query.filter_by(skill_id=skill_id).order_by(Quiz.variant, Quiz.id).all()
+    if not rows:
+        return None
+
+    variants = {}
+    for q in rows:
+        variants.setdefault(q.variant, []).append(q)
+    return [q.to_dict() for q in variants[_next_variant(skill_id, sorted(variants))]]
+
+
+def _next_variant(skill_id, variants):
+    # Counted in the shared store so consecutive requests rotate across every worker
+    turn = get_store().incr(f"quiz-rotation:{skill_id}") - 1
+    return variants[turn % len(variants)]
 
-    if score is None or not skill_name:
-        return jsonify({"error": "score and skill are required"}), 400
 
+def _bank_versions(skill_id):
+    """{variant: (question count, newest question id)} for the skill, from the quiz bank index alone."""
+    rows = (
+        db.session.query(Quiz.variant, func.count(Quiz.id), func.max(Quiz.id))
+        .filter(Quiz.skill_id == skill_id)
+        .group_by(Quiz.variant)
+        .all()
+    )
+    return {variant: (count, newest) for variant, count, newest in rows}
+
+
+def _cached_quiz_response(skill_name):
+    """Conditional GET over the quiz bank; None when the skill has no bank yet."""
     normalized_skill = skill_name.strip().lower().replace(" ", "")
     skill = Skill.query.filter_by(name=normalized_skill).first()
     if not skill:
-        skill = Skill(name=normalized_skill, description=f"Auto-created skill: {skill_name}")
-        db.session.add(skill)
-        db.session.commit()
+        return None
+    versions = _bank_versions(skill.id)
+    if not versions:
+        return None
+
+    # One strong ETag per variant, so a client keeps whichever set it was served
+    tags = {variant: http_cache.etag("quiz", skill.id, variant, *version) for variant, version in versions.items()}
+    response = http_cache.not_modified(tags.values(), "quiz")
+    if response is not None:
+        return response
+
+    variant = _next_variant(skill.id, sorted(tags))
+    key = ("quiz", skill.id, variant)
+    response = http_cache.cached_response(key, tags[variant], "quiz")
+    if response is not None:
+        return response
+
+    rows = Quiz.query.filter_by(skill_id=skill.id, variant=variant).order_by(Quiz.id).all()
+    return http_cache.render(key, tags[variant], [q.to_dict() for q in rows], "quiz")
+
+
+def build_quiz(skill_name):
+    # Normalize skill name
+    normalized_skill = skill_name.strip().lower().replace(" ", "")
+
+    # Check if the skill exists in DB; if not, create it
+    skill_obj = get_or_create_skill(normalized_skill, f"Auto-generated skill for {normalized_skill}")
+    skill_id = skill_obj.id
+
+    # Serve from the quiz bank when the skill has been generated or warmed before
+    existing_quizzes = _load_quiz(skill_id)
+    if existing_quizzes:
+        return existing_quizzes
+
+    # Cold skill: only one caller generates; concurrent callers share its questions
+    return singleflight.do(
+        f"quiz:{skill_id}:0",
+        lambda: generate_and_save_quiz(skill_id, normalized_skill),
+        lookup=lambda: _load_quiz(skill_id),
+    )
+
+
+def _level_for_score(score):
+    if score < 6:
+        return "Beginner"
+    elif 6 <= score <= 8:
+        return "Intermediate"
+    return "Advanced"
+
+
+def build_learning_path(user_id, skill_name, score):
+    from backend.path_cache import get_learning_path
+
+    normalized_skill = skill_name.strip().lower().replace(" ", "")
+    skill = get_or_create_skill(normalized_skill, f"Auto-created skill: {skill_name}")
 
     # Check existing learning path
     '''existing_path = LearningPath.query.filter_by(user_id=current_user.id, skill_id=skill.id).first()
@@ -87,67 +141,157 @@ def submit_quiz():
             "steps": [step.to_dict() for step in existing_path.steps]
         }), 200'''
 
-    # Normal quiz result creation
-    passed = score >= 6
-    if score < 6:
-        level = "Beginner"
-    elif 6 <= score <= 8:
-        level = "Intermediate"
-    else:
-        level = "Advanced"
-
-    quiz_result = QuizResult(
-        user_id=current_user.id,
-        skill_id=skill.id,
-        score=score,
-        passed=passed,
-        level=level
-    )
-    db.session.add(quiz_result)
-    db.session.commit()
+    level = _level_for_score(score)
 
-    # Generate new learning path
-    path_data = generate_learning_path(skill.name, level)
+    # Reuse a cached path for this skill/level, generating only on a miss
+    path_data = get_learning_path(skill.name, level)
     if isinstance(path_data, str):
-        try:
-            path_data = json.loads(path_data)
-        except:
-            path_data = {"topics": []}
-
-    learning_path = LearningPath(
-        user_id=current_user.id,
-        skill_id=skill.id,
-        level=level,
-        path_data=json.dumps(path_data)
-    )
-    db.session.add(learning_path)
-    db.session.commit()
+        # The model's output could not be parsed; record nothing so the user can resubmit
+        raise ValueError(f"Model returned a malformed learning path for {skill.name}")
 
-    for topic in path_data.get("topics", []):
-        step = LearningStepProgress(path_id=learning_path.id, step_name=topic.get("name"))
-        db.session.add(step)
-    db.session.commit()
+    save_submission(user_id, skill.id, level, score, path_data)
 
-    return jsonify({
+    return {
         "message": "Quiz submitted and new learning path generated",
         "skill": skill.name,
         "level": level,
         "learning_path": path_data
-    })
+    }
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json_provider.dumpb(data).decode('utf-8')}\n\n"
+
+
+def _stream_error(e):
+    # The headers are already sent, so a failure mid-stream ends it with an "error" event
+    if isinstance(e, llm.LLMBusyError):
+        message = "Generation is busy, try again shortly"
+    elif isinstance(e, TimeoutError):
+        message = "Generation timed out, try again shortly"
+    else:
+        print(f"Streamed generation failed: {e}")
+        message = "Generation failed"
+    return _sse("error", {"error": message})
+
+
+@job_handler("generate_quiz", model="gemini-2.5-pro")
+def _generate_quiz_job(payload):
+    return build_quiz(payload["skill"])
+
+
+@job_handler("submit_quiz", model="gemini-2.5-pro")
+def _submit_quiz_job(payload):
+    try:
+        return build_learning_path(payload["user_id"], payload["skill"], payload["score"])
+    except IntegrityError:
+        db.session.rollback()
+        raise ValueError("You already have an active learning path")
+
+
+@job_handler("generate_step_quizzes", model="gemini-2.5-pro")
+def _generate_step_quizzes_job(payload):
+    names = _path_step_names(payload["path_id"])
+    quizzes = step_quiz.ensure_quizzes(names)
+    return {"steps": len(names), "quizzes": len(quizzes)}
+
+
+@quiz_bp.route('/generate-quiz/<skill_name>', methods=['GET'])
+@login_required
+def generate_quiz_route(skill_name):
+    # The learner is about to submit this skill: start on its paths while they answer
+    prefetch.prefetch_paths(skill_name, current_user.id)
+
+    if _wants_async():
+        job = enqueue("generate_quiz", {"skill": skill_name}, user_id=current_user.id)
+        return accepted_response(job)
+
+    response = _cached_quiz_response(skill_name)
+    if response is not None:
+        return response
+
+    try:
+        questions = build_quiz(skill_name)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 502
+    # Serve the freshly stored set through the bank too, so the first 200 carries its ETag
+    return _cached_quiz_response(skill_name) or jsonify(questions)
+
+
+@quiz_bp.route("/submit", methods=["POST"])
+@login_required
+def submit_quiz():
+    from backend import path_cache
+
+    data = request.get_json()
+    score = data.get("score")
+    skill_name = data.get("skill")
+
+    if score is None or not skill_name:
+        return jsonify({"error": "score and skill are required"}), 400
+
+    if _wants_async():
+        job = enqueue(
+            "submit_quiz",
+            {"user_id": current_user.id, "skill": skill_name, "score": score},
+            user_id=current_user.id,
+        )
+        return accepted_response(job)
+
+    try:
+        result = build_learning_path(current_user.id, skill_name, score)
+        # A path served from the cache is spliced in from its pre-encoded copy
+        path_data = path_cache.encoded(result["skill"], result["level"], result["learning_path"])
+        return jsonify({**result, "learning_path": path_data})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 502
+    except IntegrityError:
+        return jsonify({"error": "You already have an active learning path"}), 409
 
 
 
 @quiz_bp.route("/results-of-quiz", methods=["GET"])
 @login_required
 def get_user_results():
+    """
+    Keyset-paginated quiz results, newest first.
+    Query params: limit, cursor (from next_cursor), order=asc|desc, skill, level,
+    from / to (ISO dates, to is exclusive).
+    """
     try:
-        results = QuizResult.query.filter_by(user_id=current_user.id).all()
-
-        # Skip every other record - avoiding duplicate
-        skipped_results = results[::2]
+        limit = page_size(request.args.get("limit"))
+        descending = request.args.get("order", "desc").lower() != "asc"
+
+        # Load each result's skill in the same query instead of one lazy load per row
+        query = QuizResult.query.options(joinedload(QuizResult.skill)).filter(QuizResult.user_id == current_user.id)
+
+        skill_name = request.args.get("skill")
+        if skill_name:
+            skill = Skill.query.filter_by(name=skill_name.strip().lower().replace(" ", "")).first()
+            query = query.filter(QuizResult.skill_id == (skill.id if skill else None))
+        if request.args.get("level"):
+            query = query.filter(QuizResult.level == request.args["level"])
+        if request.args.get("from"):
+            query = query.filter(QuizResult.taken_at >= datetime.fromisoformat(request.args["from"]))
+        if request.args.get("to"):
+            query = query.filter(QuizResult.taken_at < datetime.fromisoformat(request.args["to"]))
+
+        # Duplicate submissions of the same quiz are collapsed server-side
+        results, next_cursor = keyset_page(
+            query,
+            QuizResult.taken_at,
+            QuizResult.id,
+            signature=lambda r: (r.skill_id, r.level, r.score),
+            limit=limit,
+            cursor=request.args.get("cursor"),
+            descending=descending,
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
+    try:
         results_data = []
-        for r in skipped_results:
+        for r in results:
             results_data.append({
                 "id": r.id,
                 "user_id": r.user_id,
@@ -164,7 +308,9 @@ def get_user_results():
             "user_id": current_user.id,
             "username": current_user.name,
             "total_results": len(results_data),
-            "results": results_data
+            "results": results_data,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None,
         }), 200
 
     except Exception as e:
@@ -177,8 +323,7 @@ def complete_step(step_id):
     if not step:
         return jsonify({"error": "Step not found"}), 404
 
-    step.completed = True
-    db.session.commit()
+    mark_step_completed(step)
 
     return jsonify({"message": f"Step '{step.step_name}' marked as completed"})
 
@@ -193,11 +338,7 @@ def complete_skill(skill_id):
     if not all(step.completed for step in steps):
         return jsonify({"error": "Not all steps are completed yet"}), 400
 
-    # Delete learning path + steps
-    for step in steps:
-        db.session.delete(step)
-    db.session.delete(path)
-    db.session.commit()
+    delete_learning_path(path)
 
     return jsonify({
         "message": f" Congratulations {current_user.name}! You have completed the skill.",
@@ -208,16 +349,214 @@ def complete_skill(skill_id):
 @quiz_bp.route("/get-skill", methods=["GET"])
 @login_required
 def get_skill():
+    key = ("get-skill", current_user.id)
+    tag = http_cache.etag(*key, current_user.data_version)
+    response = http_cache.cached_response(key, tag, "get-skill")
+    if response is not None:
+        return response
+
+    path = load_learning_path(current_user.id)
+    if path is None:
+        return jsonify({'message': "No active learning path found"}), 404
+
+    return http_cache.render(key, tag, {
+        "message": "You already have a learning path for this skill",
+        "skill": path["skill"],
+        "level": path["level"],
+        "learning_path": path["learning_path"],
+        "steps": path["steps"]
+    }, "get-skill")
+
+
+@quiz_bp.route('/generate-quiz/<skill_name>/stream', methods=['GET'])
+@login_required
+def generate_quiz_stream(skill_name):
+    """
+    Streams the quiz via SSE: one "question" event per question as soon as it is parsed,
+    then a "summary" event. Questions are saved to the quiz bank as they arrive and
+    committed once the set is complete.
+    """
+    normalized_skill = skill_name.strip().lower().replace(" ", "")
+    skill_id = get_or_create_skill(normalized_skill, f"Auto-generated skill for {normalized_skill}").id
+    prefetch.prefetch_paths(normalized_skill, current_user.id)
+
+    def generate():
+        questions = _load_quiz(skill_id)
+        if questions:
+            for question in questions:
+                yield _sse("question", question)
+            yield _sse("summary", {"skill": normalized_skill, "count": len(questions), "source": "bank"})
+            return
+
+        try:
+            with singleflight.claim(f"quiz:{skill_id}:0") as call:
+                if call is None:
+                    # Someone else is generating this skill; wait for their set instead
+                    questions = build_quiz(normalized_skill)
+                    for question in questions:
+                        yield _sse("question", question)
+                    yield _sse("summary", {"skill": normalized_skill, "count": len(questions), "source": "shared"})
+                    return
+
+                content = []
+                for item in stream_quiz(normalized_skill):
+                    content.append(item)
+                    yield _sse("question", item)
+                    if len(content) == 10:
+                        break
+
+                if not content:
+                    yield _sse("error", {"error": f"Model returned no valid quiz questions for {normalized_skill}"})
+                    return
+
+                save_quiz_set(skill_id, content)
+                call.result = content
+        except Exception as e:
+            # claim() has already released the key and discarded any partial work
+            yield _stream_error(e)
+            return
+        yield _sse("summary", {"skill": normalized_skill, "count": len(content), "source": "generated"})
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream")
+
+
+@quiz_bp.route("/submit/stream", methods=["POST"])
+@login_required
+def submit_quiz_stream():
+    """
+    SSE variant of /submit: a "level" event once the score is graded, one "topic" event
+    per learning path topic as soon as it is parsed, then a "summary" event carrying the
+    same payload /submit returns plus the created steps.
+    """
+    from backend import path_cache
+
+    data = request.get_json()
+    score = data.get("score")
+    skill_name = data.get("skill")
+
+    if score is None or not skill_name:
+        return jsonify({"error": "score and skill are required"}), 400
+
+    normalized_skill = skill_name.strip().lower().replace(" ", "")
+    skill = get_or_create_skill(normalized_skill, f"Auto-created skill: {skill_name}")
+    user_id = current_user.id
+
+    def generate():
+        level = _level_for_score(score)
+        yield _sse("level", {"skill": skill.name, "level": level})
+
+        path_data = path_cache.peek(skill.name, level)
+        if path_data is not None:
+            for topic in path_data["topics"]:
+                yield _sse("topic", topic)
+        else:
+            try:
+                with singleflight.claim(path_cache.flight_key(skill.name, level)) as call:
+                    if call is None:
+                        # Another request is generating this path; share its result
+                        path_data = path_cache.get_learning_path(skill.name, level)
+                        if not isinstance(path_data, str):
+                            for topic in path_data["topics"]:
+                                yield _sse("topic", topic)
+                    else:
+                        topics = []
+                        for topic in stream_learning_path(skill.name, level):
+                            topics.append(topic)
+                            yield _sse("topic", topic)
+                        path_data = {"skill": skill.name, "level": level, "topics": topics}
+                        call.result = path_cache.store(skill.name, level, path_data)
+            except Exception as e:
+                yield _stream_error(e)
+                return
+
+        # Result, path and steps land in one commit, so an abandoned or malformed
+        # stream leaves nothing behind
+        try:
+            learning_path = save_submission(user_id, skill.id, level, score, path_data)
+        except ValueError:
+            yield _sse("error", {"error": f"Model returned a malformed learning path for {skill.name}"})
+            return
+        except IntegrityError:
+            yield _sse("error", {"error": "You already have an active learning path"})
+            return
+
+        yield _sse("summary", {
+            "message": "Quiz submitted and new learning path generated",
+            "skill": skill.name,
+            "level": level,
+            "learning_path": path_cache.encoded(skill.name, level, path_data),
+            "steps": [step.to_dict() for step in learning_path.steps],
+        })
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream")
+
+
+def _path_step_names(path_id):
+    return [name for (name,) in db.session.query(LearningStepProgress.step_name)
+            .filter_by(path_id=path_id).order_by(LearningStepProgress.position)]
+
+
+@quiz_bp.route("/step-quiz/<int:step_id>", methods=["GET"])
+@login_required
+def get_step_quiz(step_id):
+    """
+    Quiz for one step of the user's learning path. On a miss the quizzes for every step
+    of the path are generated together (?async=1 queues that and returns a job id).
+    """
+    step = (
+        LearningStepProgress.query.join(LearningPath)
+        .filter(LearningStepProgress.id == step_id, LearningPath.user_id == current_user.id)
+        .first()
+    )
+    if not step:
+        return jsonify({"error": "Step not found"}), 404
+
+    quiz = step_quiz.get_quizzes([step.step_name]).get(step.step_name)
+    if quiz is None:
+        if _wants_async():
+            job = enqueue("generate_step_quizzes", {"path_id": step.path_id}, user_id=current_user.id)
+            return accepted_response(job)
+        quiz = step_quiz.ensure_quizzes(_path_step_names(step.path_id)).get(step.step_name)
+        if quiz is None:
+            return jsonify({"error": f"Model returned no valid quiz questions for {step.step_name}"}), 502
+
+    key = ("step-quiz", step.id)
+    tag = http_cache.etag(*key, quiz["id"])
+    response = http_cache.cached_response(key, tag, "step-quiz")
+    if response is not None:
+        return response
+    return http_cache.render(key, tag, {
+        "step_id": step.id,
+        "step_name": step.step_name,
+        "questions": quiz["encoded"],
+    }, "step-quiz")
+
+
+@quiz_bp.route("/step-quiz", methods=["GET"])
+@login_required
+def get_step_quizzes():
+    """Quizzes for every step of the user's active learning path, generated together where missing."""
     path = LearningPath.query.filter_by(user_id=current_user.id).first()
     if not path:
-        return jsonify({'message': "No active learning path found"}), 404
+        return jsonify({"error": "No active learning path found"}), 404
 
-    skill = Skill.query.get(path.skill_id)
-    print(skill)
+    steps = (
+        db.session.query(LearningStepProgress.id, LearningStepProgress.step_name)
+        .filter_by(path_id=path.id)
+        .order_by(LearningStepProgress.position)
+        .all()
+    )
+    names = [name for _, name in steps]
+    if _wants_async() and len(step_quiz.get_quizzes(names)) < len(set(names)):
+        job = enqueue("generate_step_quizzes", {"path_id": path.id}, user_id=current_user.id)
+        return accepted_response(job)
+
+    quizzes = step_quiz.ensure_quizzes(names)
     return jsonify({
-        "message": "You already have a learning path for this skill",
-        "skill": skill.name if skill else None,
-        "level": path.level,
-        "learning_path": json.loads(path.path_data),
-        "steps": [step.to_dict() for step in path.steps]
-    }), 200
\ No newline at end of file
+        "path_id": path.id,
+        "steps": [{
+            "step_id": step_id,
+            "step_name": name,
+            "questions": quizzes[name]["questions"] if name in quizzes else None,
+        } for step_id, name in steps],
+    })
@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func
+
+from backend import singleflight
+from backend.models import db, Quiz, QuizResult, Skill
+from backend.persistence import generate_and_save_quiz, get_or_create_skill
+from backend.shared_store import get_store
+
+# Number of question sets kept per skill; the quiz route rotates between them
+QUIZ_BANK_VARIANTS = int(os.environ.get("QUIZ_BANK_VARIANTS", 3))
+QUIZ_BANK_TOP_SKILLS = int(os.environ.get("QUIZ_BANK_TOP_SKILLS", 20))
+# Seconds between scheduled warm-ups; 0 disables the scheduler thread
+QUIZ_BANK_WARM_INTERVAL = int(os.environ.get("QUIZ_BANK_WARM_INTERVAL", 0))
+
+
+def top_skills(limit=QUIZ_BANK_TOP_SKILLS):
+    """Most-requested skills by quiz results, topped up with other known skills."""
+    ranked = (
+        db.session.query(Skill.name)
+        .outerjoin(QuizResult, QuizResult.skill_id == Skill.id)
+        .group_by(Skill.id)
+        .order_by(func.count(QuizResult.id).desc(), Skill.id)
+        .limit(limit)
+        .all()
+    )
+    return [name for (name,) in ranked]
+
+
+def _has_variant(skill_id, variant):
+    exists = Quiz.query.filter_by(skill_id=skill_id, variant=variant).first()
+    return True if exists else None
+
+
+def warm_skill(skill_name, variants=QUIZ_BANK_VARIANTS):
+    """Fills in any missing quiz bank variants for one skill. Returns how many were generated."""
+    normalized_skill = skill_name.strip().lower().replace(" ", "")
+    skill_id = get_or_create_skill(normalized_skill, f"Auto-generated skill for {normalized_skill}").id
+
+    present = {v for (v,) in db.session.query(Quiz.variant).filter_by(skill_id=skill_id).distinct()}
+    generated = 0
+    for variant in range(variants):
+        if variant in present:
+            continue
+        # Same key as the quiz route uses, so a user's cold request and the warmer never race
+        result = singleflight.do(
+            f"quiz:{skill_id}:{variant}",
+            lambda: generate_and_save_quiz(skill_id, normalized_skill, variant),
+            lookup=lambda: _has_variant(skill_id, variant),
+        )
+        if result is not True:
+            generated += 1
+    return generated
+
+
+def warm(skills=None, variants=QUIZ_BANK_VARIANTS, limit=QUIZ_BANK_TOP_SKILLS):
+    skills = list(skills) if skills else top_skills(limit)
+    summary = {}
+    for skill in skills:
+        try:
+            summary[skill] = warm_skill(skill, variants)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Quiz bank warm-up failed for {skill}: {e}")
+            summary[skill] = None
+    return summary
+
+
+def start_scheduler(app, interval=QUIZ_BANK_WARM_INTERVAL):
+    """
+    Starts a daemon thread that re-warms the most requested skills every interval seconds.
+    Every worker starts one; a claim in the shared store lets only one of them warm per interval.
+    """
+    if interval <= 0:
+        return None
+
+    def run():
+        while True:
+            try:
+                # Expires just before the next round, so whichever worker wakes first takes it
+                if get_store().add("quiz-bank-warm", os.getpid(), ttl=max(1, interval - 1)):
+                    with app.app_context():
+                        warm()
+            except Exception as e:
+                # A failed round (e.g. the database is unreachable) must not stop the scheduler
+                print(f"Quiz bank warm-up round failed: {e}")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name="quiz-bank-warmer", daemon=True)
+    thread.start()
+    return thread
+
+
+@click.command("warm-quiz-bank")
+@click.argument("skills", nargs=-1)
+@click.option("--variants", default=QUIZ_BANK_VARIANTS, show_default=True, help="Question sets per skill.")
+@click.option("--top", default=QUIZ_BANK_TOP_SKILLS, show_default=True,
+              help="Number of most-requested skills to warm when no skills are given.")
+@with_appcontext
+def warm_quiz_bank_command(skills, variants, top):
+    """Pre-generates quiz bank variants for SKILLS, or for the most-requested skills."""
+    summary = warm(skills, variants=variants, limit=top)
+    for skill, generated in summary.items():
+        status = "failed" if generated is None else f"{generated} new variant(s)"
+        click.echo(f"{skill}: {status}")
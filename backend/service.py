@@ -1,17 +1,15 @@
-import os
+import asyncio
 
-from flask import Blueprint, Response, request
-from google import genai
-from google.genai import types
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from flask_login import current_user, login_required
+
+from backend import answer_cache, chat, llm, metrics
 
 service_bp = Blueprint("service", __name__, url_prefix="/service")
 
-# Initialize Gemini client
-API_KEY = os.environ.get("GEMINI_API_KEY")
-if not API_KEY:
-    raise RuntimeError("GEMINI_API_KEY not set in environment")
-client = genai.Client(api_key=API_KEY)
 MODEL = "gemini-2.0-flash"
+# Anonymous requests carry no system prompt, so their answers are cached apart from learners'
+ANONYMOUS_CONTEXT = "anonymous"
 
 
 @service_bp.route("/chat-gemini-stream", methods=["GET"])
@@ -19,29 +17,115 @@ def chat_gemini_stream():
     """
     Streams Gemini response via SSE.
     Accepts user message as query parameter: ?message=Hello
+    Signed-in users get a server-side session: the id comes back in the X-Chat-Session
+    header and is passed as ?session=<id> on the next turn to continue the conversation.
     """
     user_message = request.args.get("message", "").strip()
     if not user_message:
         return {"error": "Message cannot be empty"}, 400
 
-    def generate():
-        # Build Gemini request using same template logic
-        prompt_text = user_message  # Simply pass user input
-        contents = [
-            types.Content(role="user", parts=[types.Part.from_text(text=prompt_text)])
-        ]
-        config = types.GenerateContentConfig()
+    session_id = None
+    contents, system, cache_context = user_message, None, ANONYMOUS_CONTEXT  # Simply pass user input
+    if current_user.is_authenticated:
+        try:
+            session_id, contents, system, cache_context = chat.open_turn(
+                current_user.id, request.args.get("session") or None, user_message)
+        except chat.ChatSessionNotFound:
+            return {"error": "Chat session not found"}, 404
 
+    # Standalone questions asked before are replayed without calling the model
+    cached = answer_cache.lookup(user_message, cache_context) if cache_context is not None else None
+
+    def generate():
+        answer = []
         try:
-            for chunk in client.models.generate_content_stream(
-                model=MODEL, contents=contents, config=config
-            ):
+            # The system prefix (and its context cache) is only needed when the model is called
+            config = llm.prefix_config(MODEL, system) if cached is None and system else None
+            for text in cached or llm.stream_text(contents, model=MODEL, config=config):
+                answer.append(text)
                 # Send each chunk as SSE
-                text = chunk.text
                 if text.strip():
                     yield f"data: {text}\n\n"
+            if cached is None and cache_context is not None:
+                answer_cache.store(user_message, cache_context, answer)
         except Exception as e:
             yield f"data: [Error]: {str(e)}\n\n"
+        finally:
+            if session_id:
+                chat.close_turn(session_id, "".join(answer))
+
+    response = Response(stream_with_context(generate()), mimetype="text/event-stream")
+    if session_id:
+        response.headers["X-Chat-Session"] = session_id
+    return response
+
+
+@service_bp.route("/chat-sessions/<session_id>", methods=["GET"])
+@login_required
+def get_chat_session(session_id):
+    try:
+        session = chat.get_session(current_user.id, session_id)
+    except chat.ChatSessionNotFound:
+        return jsonify({"error": "Chat session not found"}), 404
+
+    return jsonify({
+        "id": session.id,
+        "summary": session.summary,
+        "turns": [turn.to_dict() for turn in session.turns],
+    })
+
+
+@service_bp.route("/answer-cache/stats", methods=["GET"])
+def answer_cache_stats():
+    # Same access rule as /metrics, which exports these counters too
+    if not metrics.scrape_allowed():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify(answer_cache.stats())
+
+
+async def open_chat(app, user_id, session_id, user_message):
+    """
+    Async counterpart of the session setup in chat_gemini_stream;
+    returns (session_id, contents, system, cache_context).
+    """
+    if user_id is None:
+        return None, user_message, None, ANONYMOUS_CONTEXT
+
+    def run():
+        with app.app_context():
+            return chat.open_turn(user_id, session_id, user_message)
+
+    return await asyncio.to_thread(run)
+
+
+async def _replay(chunks):
+    for text in chunks:
+        yield text
+
 
-    return Response(generate(), mimetype="text/event-stream")
+async def chat_events(app, user_message, session_id=None, contents=None, system=None, cache_context=ANONYMOUS_CONTEXT):
+    """The same SSE stream as chat_gemini_stream, produced on an event loop (see backend.asgi)."""
+    cached = answer_cache.lookup(user_message, cache_context) if cache_context is not None else None
+    answer = []
+    try:
+        if cached is not None:
+            chunks = _replay(cached)
+        else:
+            # Creating a context cache is a blocking call; keep it off the event loop
+            config = await asyncio.to_thread(llm.prefix_config, MODEL, system) if system else None
+            chunks = llm.astream_text(contents or user_message, model=MODEL, config=config)
+        async for text in chunks:
+            answer.append(text)
+            if text.strip():
+                yield f"data: {text}\n\n"
+        if cached is None and cache_context is not None:
+            answer_cache.store(user_message, cache_context, answer)
+    except Exception as e:
+        yield f"data: [Error]: {str(e)}\n\n"
+    finally:
+        if session_id:
+            def run():
+                with app.app_context():
+                    chat.close_turn(session_id, "".join(answer))
 
+            await asyncio.to_thread(run)
@@ -0,0 +1,249 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from backend.cache import LRUCache
+
+# Key/value store for state that every worker process must agree on: login and prefetch
+# limits, single-flight claims, quiz rotation, and a second tier for the response and
+# answer caches. Chosen with SHARED_STORE_URL:
+#
+#   memory://                   this process only (default; fine for a single worker)
+#   sqlite:////var/run/app.db   every process on one host
+#   redis://host:6379/0         every process on every host (needs the redis package)
+#
+# The operations mirror the Redis commands they map to (GET, SET EX, SET NX EX, INCR,
+# DEL), so the SQLite file works as a local stand-in for Redis. Values must be JSON
+# serializable.
+
+SHARED_STORE_URL = os.environ.get("SHARED_STORE_URL", "memory://")
+SHARED_STORE_PREFIX = os.environ.get("SHARED_STORE_PREFIX", "suggestify:")
+SHARED_STORE_MEMORY_SIZE = int(os.environ.get("SHARED_STORE_MEMORY_SIZE", 100000))
+
+_store = None
+_store_lock = threading.Lock()
+
+
+class MemoryStore:
+    """In-process store; values are kept as-is and must be treated as read-only."""
+
+    shared = False
+
+    def __init__(self, maxsize=SHARED_STORE_MEMORY_SIZE):
+        self._data = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self._data.get(key)
+
+    def set(self, key, value, ttl=None):
+        self._data.set(key, value, ttl=ttl)
+
+    def add(self, key, value, ttl=None):
+        """Sets key only if it is absent; True when this call set it."""
+        with self._lock:
+            if self._data.get(key) is not None:
+                return False
+            self._data.set(key, value, ttl=ttl)
+            return True
+
+    def incr(self, key, ttl=None):
+        with self._lock:
+            value = (self._data.get(key) or 0) + 1
+            self._data.set(key, value, ttl=ttl)
+            return value
+
+    def delete(self, key, value=None):
+        """Deletes key; when value is given, only if key still holds it."""
+        with self._lock:
+            if value is None or self._data.get(key) == value:
+                self._data.delete(key)
+
+    def stats(self):
+        return {"backend": "memory", **self._data.stats()}
+
+
+class SQLiteStore:
+    """One SQLite file shared by the processes on a host, with a connection per thread."""
+
+    shared = True
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+        )
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit; multi-statement operations open their own write transaction
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _expiry(ttl):
+        return time.time() + ttl if ttl else None
+
+    def _purge(self, conn):
+        # Expired rows are skipped on read; sweep them out now and then
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            conn.execute("DELETE FROM kv WHERE expires_at < ?", (time.time(),))
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value, ttl=None):
+        conn = self._connection()
+        conn.execute("INSERT OR REPLACE INTO kv VALUES (?, ?, ?)", (key, json.dumps(value), self._expiry(ttl)))
+        self._purge(conn)
+
+    def add(self, key, value, ttl=None):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM kv WHERE key = ? AND expires_at <= ?", (key, time.time()))
+            added = conn.execute(
+                "INSERT OR IGNORE INTO kv VALUES (?, ?, ?)", (key, json.dumps(value), self._expiry(ttl))
+            ).rowcount == 1
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return added
+
+    def incr(self, key, ttl=None):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, time.time())
+            ).fetchone()
+            value = (json.loads(row[0]) if row else 0) + 1
+            conn.execute("INSERT OR REPLACE INTO kv VALUES (?, ?, ?)", (key, json.dumps(value), self._expiry(ttl)))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._purge(conn)
+        return value
+
+    def delete(self, key, value=None):
+        if value is None:
+            self._connection().execute("DELETE FROM kv WHERE key = ?", (key,))
+        else:
+            self._connection().execute("DELETE FROM kv WHERE key = ? AND value = ?", (key, json.dumps(value)))
+
+    def stats(self):
+        (size,) = self._connection().execute("SELECT COUNT(*) FROM kv").fetchone()
+        return {"backend": "sqlite", "size": size}
+
+
+class RedisStore:
+    shared = True
+
+    # Compare-and-delete, so a claim is only released by its owner
+    _DELETE_IF = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("SHARED_STORE_URL points at Redis but the redis package is not installed")
+        self._client = redis.Redis.from_url(url)
+        self._delete_if = self._client.register_script(self._DELETE_IF)
+
+    @staticmethod
+    def _ex(ttl):
+        return math.ceil(ttl) if ttl else None
+
+    def get(self, key):
+        value = self._client.get(key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl=None):
+        self._client.set(key, json.dumps(value), ex=self._ex(ttl))
+
+    def add(self, key, value, ttl=None):
+        return bool(self._client.set(key, json.dumps(value), ex=self._ex(ttl), nx=True))
+
+    def incr(self, key, ttl=None):
+        pipe = self._client.pipeline()
+        pipe.incr(key)
+        if ttl:
+            pipe.expire(key, self._ex(ttl))
+        return pipe.execute()[0]
+
+    def delete(self, key, value=None):
+        if value is None:
+            self._client.delete(key)
+        else:
+            self._delete_if(keys=[key], args=[json.dumps(value)])
+
+    def stats(self):
+        return {"backend": "redis", "size": self._client.dbsize()}
+
+
+class _Namespaced:
+    """Prefixes every key, so several deployments can share one Redis database."""
+
+    def __init__(self, store, prefix):
+        self._store = store
+        self._prefix = prefix
+        self.shared = store.shared
+
+    def get(self, key):
+        return self._store.get(self._prefix + key)
+
+    def set(self, key, value, ttl=None):
+        self._store.set(self._prefix + key, value, ttl)
+
+    def add(self, key, value, ttl=None):
+        return self._store.add(self._prefix + key, value, ttl)
+
+    def incr(self, key, ttl=None):
+        return self._store.incr(self._prefix + key, ttl)
+
+    def delete(self, key, value=None):
+        self._store.delete(self._prefix + key, value)
+
+    def stats(self):
+        return self._store.stats()
+
+
+def open_store(url):
+    if url.startswith("memory://"):
+        return MemoryStore()
+    if url.startswith("sqlite:///"):
+        return _Namespaced(SQLiteStore(url[len("sqlite:///"):]), SHARED_STORE_PREFIX)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return _Namespaced(RedisStore(url), SHARED_STORE_PREFIX)
+    raise ValueError(f"Unsupported SHARED_STORE_URL: {url}")
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = open_store(SHARED_STORE_URL)
+    return _store
+
+
+def set_store(store):
+    """Swaps the store, e.g. set_store(MemoryStore()) in tests."""
+    global _store
+    with _store_lock:
+        _store = store
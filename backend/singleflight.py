@@ -0,0 +1,193 @@
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+from backend import llm
+from backend.models import db, GenerationClaim
+from backend.shared_store import get_store
+
+# How long a claim is honoured before another process may take over a dead owner's key
+SINGLEFLIGHT_CLAIM_TTL = int(os.environ.get("SINGLEFLIGHT_CLAIM_TTL", 300))
+SINGLEFLIGHT_POLL_INTERVAL = float(os.environ.get("SINGLEFLIGHT_POLL_INTERVAL", 0.5))
+
+_calls = {}
+_lock = threading.Lock()
+_stats = {"leaders": 0, "shared": 0, "remote_waits": 0}
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        # Set when the leader runs under llm.speculative() (prefetch)
+        self.speculative = False
+
+
+def do(key, fn, lookup=None, timeout=SINGLEFLIGHT_CLAIM_TTL):
+    """
+    Runs fn() at most once per key at a time and hands its result to every concurrent caller.
+    Threads in this process wait on the leader directly; other processes are kept out by a
+    claim (in the shared store when there is one, else a generation_claims row) and pick
+    the result up through lookup(), which returns the already-stored result or None.
+    """
+    with _lock:
+        call = _calls.get(key)
+        leader = call is None
+        if leader:
+            call = _Call()
+            _calls[key] = call
+
+    if not leader:
+        _stats["shared"] += 1
+        if not call.done.wait(timeout):
+            raise TimeoutError(f"Timed out waiting for generation of {key}")
+        if call.error is not None:
+            if call.speculative:
+                # A speculative leader's failure (e.g. its own budget ran out) is not this
+                # caller's; take over and generate for real
+                return do(key, fn, lookup, timeout)
+            raise call.error
+        if call.result is None:
+            # The leader gave up without producing anything (see claim()); try again
+            return do(key, fn, lookup, timeout)
+        return call.result
+
+    _stats["leaders"] += 1
+    call.speculative = llm.is_speculative()
+    try:
+        call.result = _run_claimed(key, fn, lookup, timeout)
+        return call.result
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _lock:
+            _calls.pop(key, None)
+        call.done.set()
+
+
+@contextmanager
+def claim(key):
+    """
+    Holds key for a caller that produces its result incrementally, e.g. while streaming it.
+    Yields a call object when this caller should generate, or None when another caller
+    (here or in another process) already is. Set call.result before leaving the block so
+    threads waiting in do() receive it.
+    """
+    with _lock:
+        call = None if key in _calls else _Call()
+        if call is not None:
+            _calls[key] = call
+
+    if call is None:
+        yield None
+        return
+
+    claimed = False
+    try:
+        claimed = _claim(key)
+    finally:
+        if not claimed:
+            # Another process holds the key. Unregister before yielding: the caller's
+            # fallback goes through do() on this same key and must not wait on this call
+            with _lock:
+                _calls.pop(key, None)
+            call.done.set()
+    if not claimed:
+        yield None
+        return
+
+    try:
+        _stats["leaders"] += 1
+        completed = False
+        try:
+            yield call
+            completed = True
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            if not completed:
+                # Failed or abandoned (e.g. the client disconnected); drop the partial work
+                db.session.rollback()
+            _release(key)
+    finally:
+        with _lock:
+            _calls.pop(key, None)
+        call.done.set()
+
+
+def _run_claimed(key, fn, lookup, timeout):
+    deadline = time.monotonic() + timeout
+    while True:
+        if lookup is not None:
+            existing = lookup()
+            if existing is not None:
+                return existing
+
+        if _claim(key):
+            try:
+                # The previous owner may have finished between our lookup and the claim
+                if lookup is not None:
+                    existing = lookup()
+                    if existing is not None:
+                        return existing
+                return fn()
+            except Exception:
+                # Discard the failed generation's half-done work before releasing the claim
+                db.session.rollback()
+                raise
+            finally:
+                _release(key)
+
+        # Another process is generating this key; wait for its result to land
+        _stats["remote_waits"] += 1
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Timed out waiting for generation of {key}")
+        time.sleep(SINGLEFLIGHT_POLL_INTERVAL)
+
+
+def _owner():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def _claim(key):
+    store = get_store()
+    if store.shared:
+        # The shared store expires claims of dead owners by itself
+        return store.add(f"claim:{key}", _owner(), ttl=SINGLEFLIGHT_CLAIM_TTL)
+
+    now = datetime.utcnow()
+    # Drop claims whose owner died without releasing them
+    GenerationClaim.query.filter(GenerationClaim.key == key, GenerationClaim.expires_at < now).delete()
+    db.session.add(GenerationClaim(
+        key=key,
+        owner=_owner(),
+        claimed_at=now,
+        expires_at=now + timedelta(seconds=SINGLEFLIGHT_CLAIM_TTL),
+    ))
+    try:
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
+        return False
+
+
+def _release(key):
+    store = get_store()
+    if store.shared:
+        store.delete(f"claim:{key}", _owner())
+        return
+    GenerationClaim.query.filter_by(key=key, owner=_owner()).delete()
+    db.session.commit()
+
+
+def stats():
+    return {"in_flight": len(_calls), **_stats}
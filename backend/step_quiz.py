@@ -0,0 +1,146 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import select
+
+from backend import json_provider, singleflight
+from backend.cache import LRUCache
+from backend.database import insert_ignoring_duplicates
+from backend.generator import STEP_QUIZ_PROMPT_VERSION, generate_step_quiz, stream_step_quizzes
+from backend.models import db, StepQuiz
+
+# Quizzes for learning path steps.
+#
+# A path's missing quizzes are generated together: steps are split into batches of
+# STEP_QUIZ_BATCH_SIZE with one prompt per batch, and at most STEP_QUIZ_MAX_PARALLEL
+# prompts run at a time. Steps a batched answer leaves out are retried with one prompt
+# each under the same bound. Quizzes are stored by normalized step name, so every user
+# whose path contains the same step is served the stored set instead of a new prompt.
+
+STEP_QUIZ_BATCH_SIZE = int(os.environ.get("STEP_QUIZ_BATCH_SIZE", 5))
+STEP_QUIZ_MAX_PARALLEL = int(os.environ.get("STEP_QUIZ_MAX_PARALLEL", 3))
+STEP_QUIZ_CACHE_SIZE = int(os.environ.get("STEP_QUIZ_CACHE_SIZE", 2048))
+
+# Stored quizzes never change for a prompt version, so no TTL
+_quizzes = LRUCache(maxsize=STEP_QUIZ_CACHE_SIZE)
+_stats = {"generated": 0, "batches": 0, "fallbacks": 0, "failed": 0}
+
+
+def normalize_step(step_name):
+    return " ".join(step_name.casefold().split())
+
+
+def cache_key(step_name, prompt_version=STEP_QUIZ_PROMPT_VERSION):
+    raw = f"{prompt_version}:{normalize_step(step_name)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def get_quizzes(step_names):
+    """
+    Returns {step name: {"id", "questions", "encoded"}} for the steps whose quiz is stored
+    already; "encoded" is the questions as a JSON fragment, encoded once per cache fill.
+    """
+    keys = {name: cache_key(name) for name in step_names}
+    found = {}
+    missing = []
+    for key in set(keys.values()):
+        entry = _quizzes.get(key)
+        if entry is None:
+            missing.append(key)
+        else:
+            found[key] = entry
+
+    if missing:
+        rows = db.session.execute(
+            select(StepQuiz.cache_key, StepQuiz.id, StepQuiz.questions).where(StepQuiz.cache_key.in_(missing))
+        )
+        for key, quiz_id, questions in rows:
+            entry = {"id": quiz_id, "questions": questions, "encoded": json_provider.fragment(questions)}
+            _quizzes.set(key, entry)
+            found[key] = entry
+    return {name: found[key] for name, key in keys.items() if key in found}
+
+
+def _generate_batch(step_names):
+    _stats["batches"] += 1
+    wanted = {normalize_step(name): name for name in step_names}
+    result = {}
+    try:
+        for returned, questions in stream_step_quizzes(step_names):
+            name = wanted.get(normalize_step(returned))
+            if name is not None and questions:
+                result[name] = questions
+    except Exception as e:
+        # Whatever the batch did not deliver is retried step by step
+        print(f"Step quiz batch failed: {e}")
+    return result
+
+
+def _generate_single(step_name):
+    try:
+        return generate_step_quiz(step_name)
+    except Exception as e:
+        print(f"Step quiz generation failed for {step_name}: {e}")
+        return []
+
+
+def _generate(step_names):
+    """{step name: questions} for the steps the model produced a quiz for; touches no database state."""
+    batches = [step_names[i:i + STEP_QUIZ_BATCH_SIZE] for i in range(0, len(step_names), STEP_QUIZ_BATCH_SIZE)]
+    result = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(STEP_QUIZ_MAX_PARALLEL, len(batches)))) as pool:
+        for found in pool.map(_generate_batch, batches):
+            result.update(found)
+
+        left = [name for name in step_names if name not in result]
+        _stats["fallbacks"] += len(left)
+        for name, questions in zip(left, pool.map(_generate_single, left)):
+            if questions:
+                result[name] = questions
+    return result
+
+
+def _save(generated):
+    rows = [{
+        "cache_key": cache_key(name),
+        "step_name": name,
+        "prompt_version": STEP_QUIZ_PROMPT_VERSION,
+        "questions": questions,
+    } for name, questions in generated.items()]
+    if rows:
+        insert_ignoring_duplicates(db.session, StepQuiz, rows, ["cache_key"])
+        db.session.commit()
+
+
+def ensure_quizzes(step_names):
+    """
+    Returns {step name: {"id", "questions", "encoded"}} for step_names, as get_quizzes() does,
+    generating every missing quiz in one go. Steps the model could not produce a quiz for are
+    absent from the result.
+    """
+    # One name per distinct quiz; later duplicates would only repeat the prompt
+    unique = list({cache_key(name): name for name in reversed(step_names)}.values())[::-1]
+    stored = get_quizzes(unique)
+    missing = [name for name in unique if name not in stored]
+    if not missing:
+        return get_quizzes(step_names)
+
+    def generate():
+        generated = _generate(missing)
+        _stats["generated"] += len(generated)
+        _stats["failed"] += len(missing) - len(generated)
+        _save(generated)
+        return True
+
+    def lookup():
+        # Another process finished the same set of steps
+        return True if len(get_quizzes(missing)) == len(missing) else None
+
+    flight = hashlib.sha256("\n".join(sorted(cache_key(name) for name in missing)).encode("utf-8")).hexdigest()
+    singleflight.do(f"step-quiz:{flight}", generate, lookup=lookup)
+    return get_quizzes(step_names)
+
+
+def stats():
+    return {**_quizzes.stats(), **_stats}
@@ -0,0 +1,66 @@
+import hashlib
+import json
+import os
+
+from sqlalchemy import select
+
+from backend.cache import LRUCache
+from backend.database import insert_ignoring_duplicates
+from backend.models import db, Topic
+
+# Topic rows never change once written (they are keyed by content), so decoded
+# topics are cached without a TTL and shared by every user whose path uses them
+TOPIC_CACHE_SIZE = int(os.environ.get("TOPIC_CACHE_SIZE", 4096))
+
+_topics = LRUCache(maxsize=TOPIC_CACHE_SIZE)
+
+
+def content_hash(topic):
+    canonical = json.dumps(topic, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def ensure_topics(topics):
+    """
+    Returns the Topic ids for a list of topic dicts, in the same order, inserting any
+    topic not stored yet. Runs inside the caller's transaction and does not commit.
+    """
+    hashes = [content_hash(topic) for topic in topics]
+    found = dict(db.session.execute(
+        select(Topic.content_hash, Topic.id).where(Topic.content_hash.in_(hashes))
+    ).all())
+
+    missing = {}
+    for digest, topic in zip(hashes, topics):
+        if digest not in found:
+            missing[digest] = {"content_hash": digest, "name": topic["name"], "data": topic}
+    if missing:
+        insert_ignoring_duplicates(db.session, Topic, list(missing.values()), ["content_hash"])
+        found.update(db.session.execute(
+            select(Topic.content_hash, Topic.id).where(Topic.content_hash.in_(list(missing)))
+        ).all())
+
+    # Not cached here: until the caller commits, a new row's id is not final
+    return [found[digest] for digest in hashes]
+
+
+def get_topics(topic_ids):
+    """Returns {topic_id: topic dict}, decoding from the database only the ids not cached yet."""
+    result = {}
+    missing = []
+    for topic_id in set(topic_ids):
+        topic = _topics.get(topic_id)
+        if topic is None:
+            missing.append(topic_id)
+        else:
+            result[topic_id] = topic
+
+    if missing:
+        for topic_id, data in db.session.execute(select(Topic.id, Topic.data).where(Topic.id.in_(missing))):
+            _topics.set(topic_id, data)
+            result[topic_id] = data
+    return result
+
+
+def stats():
+    return _topics.stats()